@@ -0,0 +1,55 @@
+import argparse
+import time
+
+import pandas as pd
+
+from bird_data import data_file, load_observations
+from chart_payload import line_series, payload_bytes
+from paged_table import PAGE_SIZES, page_slice
+
+
+def stack_seasons(df, seasons):
+    # Repeat the survey season in later years to emulate a multi-season archive
+    frames = []
+    for offset in range(seasons):
+        season = df.copy()
+        season['date'] = season['date'] + pd.DateOffset(years=offset)
+        frames.append(season)
+    return pd.concat(frames, ignore_index=True)
+
+
+def timed_payload(data):
+    start = time.perf_counter()
+    size = payload_bytes(data)
+    return size, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure chart/table bytes sent to the browser before and after downsampling.")
+    parser.add_argument('--parks', default='PRWI,CHOH')
+    parser.add_argument('--habitat', default='FOREST')
+    parser.add_argument('--seasons', type=int, default=20, help="survey seasons to stack per park")
+    args = parser.parse_args()
+
+    print(f"{'park':<6} {'element':<7} {'rows':>15} {'before KB':>10} {'after KB':>9} {'before ms':>10} {'after ms':>9}")
+    for park in args.parks.split(','):
+        df = stack_seasons(load_observations(data_file(park, args.habitat)), args.seasons)
+        # Daily counts over every species on every calendar day of the stacked range (the widest
+        # line chart a user can ask for), well past MAX_LINE_POINTS so LTTB actually runs
+        daily = df.groupby('date')['initial_three_min_cnt'].sum().asfreq('D', fill_value=0)
+        # The results table sends one page at the dashboards' default page size
+        start, stop, _ = page_slice(len(df), 1, PAGE_SIZES[1])
+        cases = [
+            ('line', daily, line_series(daily)),
+            ('table', df, df.iloc[start:stop]),
+        ]
+        for name, before, after in cases:
+            before_size, before_time = timed_payload(before)
+            after_size, after_time = timed_payload(after)
+            rows = f"{len(before)} -> {len(after)}"
+            print(f"{park:<6} {name:<7} {rows:>15} {before_size / 1024:>10.1f} {after_size / 1024:>9.1f} "
+                  f"{before_time * 1000:>10.1f} {after_time * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from bird_pivot import dense_pivot, park_year, species_month, year_month
+
+
+def synthetic_frames(rows, parks, years, species, seed=0):
+    # Multi-decade, multi-park archive with the stored frame's column types
+    rng = np.random.default_rng(seed)
+    names = pd.Index([f"Species {i:03d}" for i in range(species)])
+    frames = {}
+    for p in range(parks):
+        n = rows // parks
+        frames[f"P{p:02d}"] = pd.DataFrame({
+            'year': rng.integers(2018 - years + 1, 2019, n).astype('int16'),
+            'month': rng.integers(4, 9, n).astype('int8'),
+            'common_name': pd.Categorical.from_codes(rng.integers(0, species, n), categories=names),
+            'initial_three_min_cnt': rng.integers(0, 2, n).astype('float64'),
+        })
+    return frames
+
+
+def timed(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the bincount pivots with the groupby/unstack path.")
+    parser.add_argument('--rows', type=int, default=5_000_000)
+    parser.add_argument('--parks', type=int, default=15)
+    parser.add_argument('--years', type=int, default=30)
+    parser.add_argument('--species', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    frames = synthetic_frames(args.rows, args.parks, args.years, args.species)
+    df = pd.concat(frames.values(), ignore_index=True)
+    cnt = 'initial_three_min_cnt'
+
+    def groupby_park_year():
+        stacked = pd.concat([frame.assign(park=park) for park, frame in frames.items()], ignore_index=True)
+        return stacked.groupby(['park', 'year'])[cnt].sum().unstack().fillna(0)
+
+    cases = [
+        ('year x month', lambda: df.groupby(['year', 'month'])[cnt].sum().unstack().fillna(0),
+         lambda: year_month(df)),
+        ('species x month', lambda: df.groupby(['common_name', 'month'], observed=True)[cnt].sum().unstack().fillna(0),
+         lambda: species_month(df)),
+        ('park x year', groupby_park_year, lambda: park_year(frames)),
+    ]
+    print(f"{len(df):,} rows, {args.parks} parks, {args.years} years, {args.species} species")
+    print(f"{'view':<16} {'groupby ms':>11} {'bincount ms':>12} {'speedup':>8}  match")
+    for name, slow, fast in cases:
+        expected, slow_time = timed(slow, args.repeat)
+        result, fast_time = timed(fast, args.repeat)
+        aligned = result.reindex(index=expected.index, columns=expected.columns)
+        match = np.allclose(aligned.to_numpy(), expected.to_numpy())
+        print(f"{name:<16} {slow_time * 1000:>11.1f} {fast_time * 1000:>12.1f} {slow_time / fast_time:>7.1f}x  {match}")
+
+
+if __name__ == "__main__":
+    main()
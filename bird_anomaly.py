@@ -0,0 +1,159 @@
+import argparse
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from bird_data import all_data_files
+from bird_diversity import dataset_frames
+from filter_cache import FilterCache
+from perf_spans import span
+
+# Trailing baseline of the previous WINDOW survey days of the same park; alerts need at least
+# MIN_HISTORY of them and a robust z-score of THRESHOLD or more
+WINDOW = 8
+MIN_HISTORY = 3
+THRESHOLD = 3.5
+# Detections per point visit; keeps zero-MAD baselines of rare species from alerting on one bird
+SCALE_FLOOR = 0.25
+MAD_SCALE = 1.4826
+# Days with fewer point visits are too noisy to score
+MIN_DAY_VISITS = 3
+SERIES_BLOCK = 4096
+
+ANOMALY_CACHE = FilterCache(max_entries=16, max_bytes=64 * 1024 * 1024, ttl=24 * 3600)
+
+
+def daily_matrix(frames):
+    # Stacked survey-day x series matrix of detections per point visit. Row i of a park's
+    # columns is that park's i-th survey day; parks with fewer days are NaN-padded at the end.
+    # Returns (values, day numbers, months, series labels).
+    species = pd.Index(sorted(set().union(*[df['common_name'].cat.categories for df in frames.values()])))
+    blocks, days, series = [], [], []
+    for (habitat, park), df in frames.items():
+        day = df['day_number'].to_numpy(dtype=np.int64)
+        visits = df.drop_duplicates(['plot_name', 'date', 'visit'])['day_number'].value_counts()
+        survey_days = np.sort(visits.index[visits >= MIN_DAY_VISITS].to_numpy(dtype=np.int64))
+        row = np.searchsorted(survey_days, day)
+        row_ok = (row < len(survey_days)) & (survey_days[np.minimum(row, len(survey_days) - 1)] == day)
+        names = df['common_name']
+        codes = species.get_indexer(names.cat.categories)[np.maximum(names.cat.codes.to_numpy(), 0)]
+        keep = row_ok & (names.cat.codes.to_numpy() >= 0)
+        counts = np.bincount(row[keep] * len(species) + codes[keep],
+                             minlength=len(survey_days) * len(species)).reshape(len(survey_days), len(species))
+        present = counts.sum(axis=0) > 0
+        blocks.append(counts[:, present] / visits.reindex(survey_days).to_numpy()[:, None])
+        days.append(np.repeat(survey_days[:, None], present.sum(), axis=1))
+        series.append(pd.DataFrame({'park': f"{habitat}-{park}", 'species': species[present]}))
+
+    n_rows = max((len(block) for block in blocks), default=0)
+    values = np.full((n_rows, sum(block.shape[1] for block in blocks)), np.nan)
+    day_numbers = np.full(values.shape, -1, dtype=np.int64)
+    column = 0
+    for block, day in zip(blocks, days):
+        values[:len(block), column:column + block.shape[1]] = block
+        day_numbers[:len(block), column:column + block.shape[1]] = day
+        column += block.shape[1]
+    dates = pd.to_datetime(np.where(day_numbers >= 0, day_numbers, 0).ravel(), unit='D')
+    months = np.where(day_numbers >= 0, dates.month.to_numpy().reshape(values.shape), 0)
+    labels = pd.concat(series, ignore_index=True) if series else pd.DataFrame(columns=['park', 'species'])
+    return values, day_numbers, months, labels
+
+
+def seasonal_profile(values, months):
+    # Month-of-year median of each series minus its overall median (12 masked passes);
+    # only meaningful once a series spans several years, so callers decide when to use it
+    seasonal = np.zeros_like(values)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        overall = np.nanmedian(values, axis=0)
+        for month in range(1, 13):
+            in_month = months == month
+            if in_month.any():
+                level = np.nanmedian(np.where(in_month, values, np.nan), axis=0) - overall
+                seasonal = np.where(in_month, np.nan_to_num(level), seasonal)
+    return seasonal
+
+
+def robust_scores(values, window=WINDOW):
+    # Baseline median and MAD of the previous `window` rows of every column at once, and the
+    # robust z-score of each row against them. The window is a strided view, so the cost is
+    # rows x series x window.
+    n_rows, n_series = values.shape
+    padded = np.vstack([np.full((window, n_series), np.nan), values])
+    history = sliding_window_view(padded[:-1], window, axis=0)
+    # All-NaN windows (short histories, padding) just give NaN baselines
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        baseline = np.nanmedian(history, axis=2)
+        mad = np.nanmedian(np.abs(history - baseline[:, :, None]), axis=2)
+    count = np.isfinite(history).sum(axis=2)
+    scale = np.maximum(MAD_SCALE * mad, SCALE_FLOOR)
+    z = (values - baseline) / scale
+    return baseline, scale, np.where(count >= MIN_HISTORY, z, np.nan)
+
+
+def anomaly_table(frames, window=WINDOW, threshold=THRESHOLD, seasonal=None):
+    # Ranked alerts for every species x park daily series. Series are scored in column blocks so
+    # memory stays bounded; each block is one vectorized pass.
+    values, day_numbers, months, labels = daily_matrix(frames)
+    if seasonal is None:
+        years = pd.to_datetime(day_numbers[day_numbers >= 0], unit='D').year
+        seasonal = len(np.unique(years)) > 1
+    alerts = []
+    for start in range(0, values.shape[1], SERIES_BLOCK):
+        block = slice(start, start + SERIES_BLOCK)
+        adjusted = values[:, block]
+        profile = seasonal_profile(adjusted, months[:, block]) if seasonal else 0.0
+        baseline, scale, z = robust_scores(adjusted - profile, window)
+        rows, cols = np.nonzero(np.abs(np.nan_to_num(z)) >= threshold)
+        alerts.append(pd.DataFrame({
+            'park': labels['park'].to_numpy()[start + cols],
+            'species': labels['species'].to_numpy()[start + cols],
+            'date': pd.to_datetime(day_numbers[rows, start + cols], unit='D'),
+            'per_visit': adjusted[rows, cols],
+            'expected': (baseline + profile)[rows, cols] if seasonal else baseline[rows, cols],
+            'z': z[rows, cols],
+        }))
+    table = pd.concat(alerts, ignore_index=True) if alerts else pd.DataFrame(
+        columns=['park', 'species', 'date', 'per_visit', 'expected', 'z'])
+    table['kind'] = np.where(table['z'] > 0, 'spike', 'collapse')
+    table = table.reindex(table['z'].abs().sort_values(ascending=False).index).reset_index(drop=True)
+    table.attrs['series'] = values.shape[1]
+    return table
+
+
+def anomalies(files=None, window=WINDOW, threshold=THRESHOLD):
+    # Alert table for every park, cached per combined dataset version
+    frames, version = dataset_frames(files or all_data_files())
+
+    def compute():
+        with span('anomaly_scan', rows_in=sum(len(df) for df in frames.values())) as stage:
+            table = anomaly_table(frames, window, threshold)
+            stage.rows_out = len(table)
+        return table
+
+    return ANOMALY_CACHE.get_or_compute('anomalies', version, {'window': window, 'threshold': threshold}, compute)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flag sudden spikes and collapses in every species x park daily series.")
+    parser.add_argument('--window', type=int, default=WINDOW, help="previous survey days in the baseline")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help="robust z-score to alert on")
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--output', help="write every alert to this CSV")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    table = anomalies(window=args.window, threshold=args.threshold)
+    elapsed = time.perf_counter() - start
+    print(table.head(args.top).round({'per_visit': 3, 'expected': 3, 'z': 2}).to_string(index=False))
+    print(f"\n{len(table)} alerts across {table.attrs.get('series', 0)} series in {elapsed:.2f}s")
+    if args.output:
+        table.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+import argparse
+import hashlib
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from bird_data import all_data_files, parse_data_file
+from bird_ingest import ingest_park
+from bird_store import ParkStore, park_lock, replace_atomically
+from filter_cache import FilterCache
+from perf_spans import span
+
+STATE_FILE = 'cooccurrence.npz'
+COUNT_DTYPE = np.dtype('int32')
+
+# Combined species x species counts and pair tables, keyed by the parks' store versions
+COOCCURRENCE_CACHE = FilterCache(max_entries=32, max_bytes=256 * 1024 * 1024, ttl=24 * 3600)
+
+
+def visit_keys(plots, days, visits):
+    # One int64 per survey visit (plot, date, visit round) from the stored codes;
+    # missing visit rounds share key 0, missing plots/dates give -1
+    rounds = np.nan_to_num(np.asarray(visits, dtype='float64'), nan=-1).astype('int64') + 1
+    plots = np.asarray(plots, dtype='int64')
+    days = np.asarray(days, dtype='int64')
+    keys = (plots << 40) | ((days & 0xFFFFFFFF) << 8) | (rounds & 0xFF)
+    keys[(plots < 0) | (days < 0)] = -1
+    return keys
+
+
+def _resize(matrix, shape):
+    # Grow a CSR matrix with empty rows/columns (indices never move)
+    matrix = matrix.tocsr()
+    indptr = np.concatenate([matrix.indptr, np.full(shape[0] - matrix.shape[0], matrix.indptr[-1])])
+    return sp.csr_matrix((matrix.data, matrix.indices, indptr), shape=shape)
+
+
+class Cooccurrence:
+    """Visit x species incidence and species x species co-occurrence counts for one park store."""
+
+    def __init__(self, n_species=0):
+        self.rows = 0
+        self.batches = 0
+        self.signature = ''
+        self.visit_keys = np.zeros(0, dtype='int64')
+        self.incidence = sp.csr_matrix((0, n_species), dtype=COUNT_DTYPE)
+        self.counts = sp.csr_matrix((n_species, n_species), dtype=COUNT_DTYPE)
+
+    @property
+    def n_visits(self):
+        return len(self.visit_keys)
+
+    def update(self, store):
+        # Fold the rows appended since the last update into the incidence and the counts.
+        # With X the old incidence and D its new entries: (X + D)'(X + D) = X'X + D'X + X'D + D'D,
+        # and D is non-zero only on the visits the new rows touched.
+        start, end = self.rows, store.rows
+        n_species = len(store.dictionary('common_name')) if end else 0
+        species = store.column('common_name')[start:end].astype('int64')
+        keys = visit_keys(store.column('plot_name')[start:end], store.column('day_number')[start:end],
+                          store.column('visit')[start:end])
+        keep = (species >= 0) & (keys >= 0)
+        species, keys = species[keep], keys[keep]
+
+        # Visits already in the incidence keep their row; new visits are appended in order of appearance
+        ids = pd.Index(self.visit_keys).get_indexer(keys) if self.n_visits else np.full(len(keys), -1)
+        new = ids < 0
+        codes, fresh = pd.factorize(keys[new])
+        ids[new] = codes + self.n_visits
+        self.visit_keys = np.concatenate([self.visit_keys, fresh])
+        shape = (self.n_visits, n_species)
+
+        incidence = _resize(self.incidence, shape)
+        delta = sp.csr_matrix((np.ones(len(ids), dtype=COUNT_DTYPE), (ids, species)), shape=shape)
+        delta.data[:] = 1
+        # Drop detections of species the visit already had
+        delta = (delta - delta.multiply(incidence)).tocsr()
+        delta.eliminate_zeros()
+
+        cross = (delta.T @ incidence).tocsr()
+        counts = _resize(self.counts, (n_species, n_species))
+        self.counts = (counts + cross + cross.T + delta.T @ delta).tocsr()
+        self.incidence = (incidence + delta).tocsr()
+        self.rows = end
+        self.batches = len(store.manifest['batches']) if store.manifest else 0
+        self.signature = store.batches_signature(self.batches)
+
+    def save(self, path):
+        def write(tmp):
+            np.savez(tmp, rows=self.rows, batches=self.batches, signature=self.signature, visit_keys=self.visit_keys,
+                     shape=self.incidence.shape, indptr=self.incidence.indptr, indices=self.incidence.indices,
+                     count_data=self.counts.data, count_indices=self.counts.indices, count_indptr=self.counts.indptr)
+        replace_atomically(path, write, suffix='.npz')
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            state = cls()
+            state.rows = int(data['rows'])
+            state.batches = int(data['batches'])
+            state.signature = str(data['signature'])
+            state.visit_keys = data['visit_keys']
+            shape = tuple(data['shape'])
+            state.incidence = sp.csr_matrix((np.ones(len(data['indices']), dtype=COUNT_DTYPE), data['indices'],
+                                             data['indptr']), shape=shape)
+            state.counts = sp.csr_matrix((data['count_data'], data['count_indices'], data['count_indptr']),
+                                         shape=(shape[1], shape[1]))
+        return state
+
+
+def park_cooccurrence(path, root=None):
+    # Persisted next to the park's columnar store and brought up to date with the rows appended since.
+    # The state lock is taken before ingest_park takes the ingest lock, so concurrent callers neither
+    # race on the state file nor rebuild it from a store another writer is resetting.
+    habitat, park = parse_data_file(path)
+    with park_lock(habitat, park, root, name='cooccurrence'):
+        ingest_park(path, root)
+        store = ParkStore(habitat, park, root)
+        state_path = os.path.join(store.path, STATE_FILE)
+        state = Cooccurrence.load(state_path) if os.path.exists(state_path) else None
+        if state is None or state.rows > store.rows or state.signature != store.batches_signature(state.batches):
+            state = Cooccurrence()
+        if state.rows < store.rows:
+            with span('cooccurrence_update', rows_in=store.rows - state.rows) as stage:
+                state.update(store)
+                stage.rows_out = state.n_visits
+            state.save(state_path)
+        return state, pd.Index(store.dictionary('common_name') if store.rows else [], dtype=object)
+
+
+def combined_counts(parks):
+    # parks: {name: (state, species labels)}. Sums every park's counts over the union of species;
+    # returns (counts CSR, visits per species, total visits, species labels)
+    species = pd.Index(sorted(set().union(*[labels for _, labels in parks.values()])), dtype=object)
+    counts = sp.csr_matrix((len(species), len(species)), dtype='int64')
+    n_visits = 0
+    for state, labels in parks.values():
+        # Park species codes -> union positions as a 0/1 mapping matrix P; the park adds P' C P
+        mapping = sp.csr_matrix((np.ones(len(labels), dtype='int64'), (np.arange(len(labels)),
+                                 species.get_indexer(labels))), shape=(len(labels), len(species)))
+        counts = counts + mapping.T @ state.counts.astype('int64') @ mapping
+        n_visits += state.n_visits
+    counts = counts.tocsr()
+    return counts, counts.diagonal(), n_visits, species
+
+
+def association_table(counts, occurrences, n_visits, species, min_together=1):
+    # One row per species pair seen together at least min_together times: raw count, Jaccard
+    # |A and B| / |A or B| and pointwise mutual information log(P(A, B) / (P(A) P(B)))
+    pairs = sp.triu(counts, k=1).tocoo()
+    keep = pairs.data >= min_together
+    a, b, together = pairs.row[keep], pairs.col[keep], pairs.data[keep].astype('float64')
+    n_a, n_b = occurrences[a].astype('float64'), occurrences[b].astype('float64')
+    return pd.DataFrame({
+        'species_a': species[a],
+        'species_b': species[b],
+        'together': together.astype('int64'),
+        'visits_a': n_a.astype('int64'),
+        'visits_b': n_b.astype('int64'),
+        'jaccard': together / (n_a + n_b - together),
+        'pmi': np.log(together * n_visits / (n_a * n_b)),
+    })
+
+
+def _selected_files(parks=None):
+    return {key: path for key, path in sorted(all_data_files().items())
+            if (parks is None or key[1] in parks) and (os.path.exists(path) or ParkStore(*key).rows)}
+
+
+def cooccurrence(parks=None, min_together=1, root=None):
+    # Pair table for one or more parks (default: all), cached per combined store version
+    states = {f"{habitat}-{park}": park_cooccurrence(path, root)
+              for (habitat, park), path in _selected_files(parks).items()}
+    version = hashlib.sha1(','.join(f"{name}={state.rows}:{state.signature}"
+                                    for name, (state, _) in states.items()).encode()).hexdigest()[:16]
+
+    def compute():
+        with span('cooccurrence_scores', rows_in=sum(state.n_visits for state, _ in states.values())) as stage:
+            table = association_table(*combined_counts(states), min_together=min_together)
+            stage.rows_out = len(table)
+        return table
+
+    return COOCCURRENCE_CACHE.get_or_compute('cooccurrence', version,
+                                             {'parks': sorted(states), 'min_together': min_together}, compute)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Species co-occurrence at the same plot visit, per park or across parks.")
+    parser.add_argument('--parks', help="comma separated park codes (default: all)")
+    parser.add_argument('--min-together', type=int, default=5, help="minimum shared visits for a pair to be listed")
+    parser.add_argument('--sort', choices=['together', 'jaccard', 'pmi'], default='jaccard')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--output', help="write the full pair table to this CSV")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    table = cooccurrence(set(args.parks.split(',')) if args.parks else None, args.min_together)
+    elapsed = time.perf_counter() - start
+    table = table.sort_values(args.sort, ascending=False)
+    print(table.head(args.top).round(3).to_string(index=False))
+    print(f"\n{len(table)} pairs in {elapsed:.2f}s")
+    if args.output:
+        table.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
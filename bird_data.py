@@ -0,0 +1,170 @@
+import hashlib
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from perf_spans import span
+
+# Park datasets exported from the monitoring workbooks, keyed by (habitat, park)
+HABITAT_PARKS = {
+    'FOREST': ['ANTI', 'CATO', 'CHOH', 'GWMP', 'HAFE', 'MANA', 'MONO', 'NACE', 'PRWI', 'ROCR', 'WOTR'],
+    'GRASSLAND': ['ANTI', 'HAFE', 'MANA', 'MONO'],
+}
+
+
+def data_file(park, habitat='FOREST'):
+    return f"Bird_Monitoring_Data_{habitat}.XLSX - {park}.csv"
+
+
+def workbook_file(habitat='FOREST'):
+    # The source workbook the per-park CSVs were exported from, one sheet per park
+    return f"Bird_Monitoring_Data_{habitat}.XLSX"
+
+
+def parse_data_file(path):
+    # "Bird_Monitoring_Data_FOREST.XLSX - CHOH.csv" -> ('FOREST', 'CHOH')
+    name = os.path.basename(path)
+    habitat = name.split('Bird_Monitoring_Data_', 1)[1].split('.', 1)[0]
+    park = name.rsplit(' - ', 1)[1].rsplit('.', 1)[0]
+    return habitat, park
+
+
+def all_data_files():
+    return {(habitat, park): data_file(park, habitat)
+            for habitat, parks in HABITAT_PARKS.items() for park in parks}
+
+
+# Integer date dimension attached at ingest so filters and groupbys never need .dt accessors
+DATE_DIMENSION = {
+    'year': 'int16',
+    'month': 'int8',
+    'day_of_year': 'int16',
+    'iso_week': 'int8',
+    'season': 'int8',
+    'day_number': 'int32',
+}
+SEASONS = ['Winter', 'Spring', 'Summer', 'Autumn']
+
+
+def clean_columns(df):
+    df.columns = df.columns.str.strip().str.lower().str.replace(" ", "_")
+    return df
+
+
+# Content hash of a data file, recomputed only when its size or mtime changes
+_versions = {}
+
+
+def dataset_version(path):
+    stat = os.stat(path)
+    stamp = (stat.st_size, stat.st_mtime_ns)
+    cached = _versions.get(path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    digest = hashlib.sha1()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 20), b''):
+            digest.update(block)
+    version = digest.hexdigest()[:16]
+    _versions[path] = (stamp, version)
+    return version
+
+
+def parse_observations(df):
+    df = clean_columns(df)
+
+    # Convert date/count/weather fields
+    with span('parse_types', rows_in=len(df)) as stage:
+        # Workbook ingest hands over dates already typed; only CSV text needs parsing
+        if not pd.api.types.is_datetime64_any_dtype(df['date']):
+            df['date'] = pd.to_datetime(df['date'], errors='coerce')
+        df['initial_three_min_cnt'] = pd.to_numeric(df['initial_three_min_cnt'], errors='coerce')
+        for col in ['temperature', 'humidity']:
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col], errors='coerce')
+        for col in ['start_time', 'end_time']:
+            if col in df.columns:
+                df[col] = pd.to_datetime(df[col], errors='coerce').dt.time
+        stage.rows_out = len(df)
+    return df
+
+
+def drop_incomplete(df):
+    with span('clean', rows_in=len(df)) as stage:
+        # Drop incomplete rows
+        df = df.dropna(subset=['date', 'common_name', 'initial_three_min_cnt']).reset_index(drop=True)
+
+        # Combine common and scientific names
+        df['full_name'] = df['common_name']
+        if 'scientific_name' in df.columns:
+            df['scientific_name'] = df['scientific_name'].fillna("").str.strip()
+            has_sci = df['scientific_name'] != ""
+            df['full_name'] = np.where(has_sci, df['common_name'] + " (" + df['scientific_name'] + ")", df['common_name'])
+        stage.rows_out = len(df)
+    return df
+
+
+def add_date_dimension(df):
+    # Rows reaching the store always have a date, so every field is a plain integer
+    days = df['date'].to_numpy(dtype='datetime64[D]')
+    months = days.astype('datetime64[M]')
+    years = days.astype('datetime64[Y]')
+    month = months.astype('int64') % 12 + 1
+    df['year'] = (years.astype('int64') + 1970).astype('int16')
+    df['month'] = month.astype('int8')
+    df['day_of_year'] = ((days - years.astype('datetime64[D]')).astype('int64') + 1).astype('int16')
+    df['iso_week'] = df['date'].dt.isocalendar().week.to_numpy(dtype='int8')
+    df['season'] = (month % 12 // 3).astype('int8')
+    df['day_number'] = days.astype('int64').astype('int32')
+    return df
+
+
+def clean_observations(df):
+    return drop_incomplete(parse_observations(df))
+
+
+def load_observations(path):
+    with span('read_csv') as stage:
+        df = pd.read_csv(path)
+        stage.rows_out = len(df)
+    return clean_observations(df)
+
+
+def iter_observations(path, chunk_rows=100_000):
+    # Cleaned chunks of a data file without holding the whole file in memory
+    for chunk in pd.read_csv(path, chunksize=chunk_rows):
+        yield clean_observations(chunk)
+
+
+def _read_only(df):
+    # Rebuild the frame over non-writeable arrays so sessions cannot mutate it
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series.dtype, np.dtype):
+            values = series.to_numpy(copy=True)
+            values.setflags(write=False)
+            columns[col] = values
+        else:
+            columns[col] = series.array
+    return pd.DataFrame(columns, copy=False)
+
+
+# One cleaned, read-only frame per data file for the whole server process
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared_observations(path):
+    # Served from the columnar store, which ingests only rows added since the last load
+    from bird_ingest import source_version, stored_observations
+
+    version = source_version(path)
+    with _shared_lock:
+        entry = _shared.get(path)
+        if entry is None or entry[0] != version:
+            entry = (version, _read_only(stored_observations(path)))
+            _shared[path] = entry
+    return entry[1], version
@@ -0,0 +1,119 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from bird_data import all_data_files, iter_observations
+from bird_store import NUMERIC_COLUMNS
+
+# Ingest drops exact duplicate rows by default; 'flag' keeps them with is_duplicate set, 'off' skips the stage
+DEDUPE_MODE = os.environ.get('BIRD_DEDUPE', 'drop')
+# Columns that make two rows "the same" (default: every column)
+DEDUPE_KEYS = os.environ.get('BIRD_DEDUPE_KEYS', '').split(',') if os.environ.get('BIRD_DEDUPE_KEYS') else None
+DERIVED_COLUMNS = ['full_name', 'is_duplicate']
+
+
+def _column_hash(col, values):
+    # Hash each column by its stored kind so a value hashes the same in every chunk,
+    # whatever dtype read_csv happened to infer for that chunk
+    if col == 'date':
+        return pd.util.hash_array(pd.to_datetime(values).to_numpy(dtype='datetime64[ns]').view('int64'))
+    if col in NUMERIC_COLUMNS:
+        return pd.util.hash_array(pd.to_numeric(values, errors='coerce').to_numpy(dtype='float64'))
+    # Text: hash the few distinct values once, then gather by code
+    codes, uniques = pd.factorize(values)
+    hashed = pd.util.hash_array(np.array([str(v) for v in uniques] + ['\0'], dtype=object))
+    return hashed[codes]
+
+
+def row_hashes(df, keys=None):
+    # 64-bit hash per row over the key columns
+    keys = keys or [col for col in df.columns if col not in DERIVED_COLUMNS]
+    columns = {}
+    for col in keys:
+        values = df[col] if col in df.columns else pd.Series(None, index=df.index, dtype=object)
+        columns[col] = _column_hash(col, values)
+    return pd.util.hash_pandas_object(pd.DataFrame(columns), index=False).to_numpy(dtype='uint64')
+
+
+class Deduper:
+    """Streaming exact-duplicate removal; only one 8-byte hash per kept row is remembered."""
+
+    def __init__(self, keys=None, mode='drop', seen=None):
+        self.keys = keys
+        self.mode = mode
+        # Sorted uint64 array, so lookups are a binary search and memory is 8 bytes per row
+        self.seen = np.unique(np.asarray(seen, dtype='uint64')) if seen is not None else np.zeros(0, dtype='uint64')
+        self.rows = 0
+        self.duplicates = 0
+        self.samples = []
+
+    def apply(self, chunk, max_samples=5):
+        # Returns (chunk, hashes of the rows that were kept)
+        hashes = row_hashes(chunk, self.keys)
+        duplicate = pd.Series(hashes).duplicated().to_numpy(copy=True)
+        first = hashes[~duplicate]
+        position = np.searchsorted(self.seen, first)
+        known = np.zeros(len(first), dtype=bool)
+        if len(self.seen):
+            known = self.seen[np.minimum(position, len(self.seen) - 1)] == first
+        duplicate[~duplicate] = known
+        # Sorted insert of the new hashes (unique within the chunk already)
+        new = np.sort(first[~known])
+        self.seen = np.insert(self.seen, np.searchsorted(self.seen, new), new)
+
+        self.rows += len(chunk)
+        found = int(duplicate.sum())
+        self.duplicates += found
+        if found and len(self.samples) < max_samples:
+            self.samples.append(chunk[duplicate].head(max_samples - len(self.samples)))
+        if self.mode == 'flag':
+            chunk = chunk.assign(is_duplicate=duplicate.astype('float64'))
+            return chunk, hashes
+        return chunk[~duplicate].reset_index(drop=True), hashes[~duplicate]
+
+    def report(self):
+        return {'rows': self.rows, 'duplicates': self.duplicates,
+                'duplicate_pct': round(100 * self.duplicates / self.rows, 2) if self.rows else 0.0}
+
+
+def store_deduper(store):
+    # Ingest-time deduper seeded with the hashes of the rows already in a park store
+    if DEDUPE_MODE == 'off':
+        return None
+    return Deduper(DEDUPE_KEYS, DEDUPE_MODE, seen=store.row_hashes())
+
+
+def dedupe_report(files, keys=None, chunk_rows=100_000):
+    # Per-park duplicate counts, streamed chunk by chunk; files: {(habitat, park): path}
+    rows, samples = [], []
+    for (habitat, park), path in files.items():
+        deduper = Deduper(keys, mode='flag')
+        for chunk in iter_observations(path, chunk_rows):
+            deduper.apply(chunk)
+        rows.append({'habitat': habitat, 'park': park, **deduper.report()})
+        for sample in deduper.samples:
+            samples.append(sample.assign(habitat=habitat, park=park))
+    return pd.DataFrame(rows), (pd.concat(samples, ignore_index=True) if samples else pd.DataFrame())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report exact duplicate observation rows per park.")
+    parser.add_argument('--keys', help="comma separated key columns (default: every column)")
+    parser.add_argument('--parks', help="comma separated park codes (default: all)")
+    parser.add_argument('--samples', action='store_true', help="also print a few duplicate rows")
+    parser.add_argument('--chunk-rows', type=int, default=100_000)
+    args = parser.parse_args()
+
+    parks = set(args.parks.split(',')) if args.parks else None
+    files = {key: path for key, path in all_data_files().items()
+             if (parks is None or key[1] in parks) and os.path.exists(path)}
+    report, samples = dedupe_report(files, args.keys.split(',') if args.keys else None, args.chunk_rows)
+    print(report.to_string(index=False))
+    if args.samples and len(samples):
+        print(samples[['habitat', 'park', 'date', 'plot_name', 'common_name', 'initial_three_min_cnt']].to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from bird_data import all_data_files
+from bird_diversity import dataset_frames
+from filter_cache import FilterCache
+from perf_spans import span
+
+# Point-count distance bands (metres); detections beyond the last edge are not recorded
+DISTANCE_BANDS = {'<= 50 Meters': (0.0, 50.0), '50 - 100 Meters': (50.0, 100.0)}
+EDGES = np.array([0.0, 50.0, 100.0])
+KEYS = ['half-normal', 'hazard-rate']
+# Two bands leave one degree of freedom, so the hazard-rate shape is fixed and only its scale fitted
+HAZARD_SHAPE = 3.0
+LOG_SIGMA_BOUNDS = (np.log(10.0), np.log(5000.0))
+GOLDEN_STEPS = 45
+# Species with fewer detections use the park-year's pooled detection function
+MIN_DETECTIONS = 20
+N_BOOT = 200
+POINT_COLUMNS = ['plot_name', 'date', 'visit']
+
+DENSITY_CACHE = FilterCache(max_entries=16, max_bytes=64 * 1024 * 1024, ttl=24 * 3600)
+
+_NODES, _WEIGHTS = np.polynomial.legendre.leggauss(24)
+
+
+def band_integrals(sigma, edges=EDGES, key='half-normal'):
+    # integral of r g(r) dr over every band for each sigma (points detect in a circle, so the
+    # distance density is proportional to r g(r)); returns (len(sigma), bands)
+    sigma = np.asarray(sigma, dtype='float64')[:, None]
+    low, high = edges[:-1][None, :], edges[1:][None, :]
+    if key == 'half-normal':
+        return sigma ** 2 * (np.exp(-low ** 2 / (2 * sigma ** 2)) - np.exp(-high ** 2 / (2 * sigma ** 2)))
+    # Hazard-rate g(r) = 1 - exp(-(r / sigma)^-b) by Gauss-Legendre quadrature on each band
+    half = (high - low) / 2
+    r = (low + half)[:, :, None] + half[:, :, None] * _NODES
+    with np.errstate(divide='ignore', over='ignore'):
+        g = -np.expm1(-(np.maximum(r, 1e-9) / sigma[:, :, None]) ** -HAZARD_SHAPE)
+    return (half * (r * g * _WEIGHTS).sum(axis=2))
+
+
+def maximize_bounded(loglik, n, bounds, steps=GOLDEN_STEPS):
+    # Golden-section search for the maximum of n unimodal 1-D functions at once;
+    # loglik(x) takes and returns arrays of length n
+    ratio = (np.sqrt(5) - 1) / 2
+    low, high = np.full(n, bounds[0], dtype='float64'), np.full(n, bounds[1], dtype='float64')
+    x1, x2 = high - ratio * (high - low), low + ratio * (high - low)
+    f1, f2 = loglik(x1), loglik(x2)
+    for _ in range(steps):
+        left = f1 > f2
+        high = np.where(left, x2, high)
+        low = np.where(left, low, x1)
+        x1, x2 = np.where(left, high - ratio * (high - low), x2), np.where(left, x1, low + ratio * (high - low))
+        # Only the new interior point needs a likelihood
+        fresh = loglik(np.where(left, x1, x2))
+        f1, f2 = np.where(left, fresh, f2), np.where(left, f1, fresh)
+    return (low + high) / 2
+
+
+def fit_scale(counts, edges=EDGES, key='half-normal'):
+    # Maximum-likelihood log sigma of the binned (multinomial) distances for every row of counts
+    # at once. Bootstrap replicates repeat the same small count vectors, so each distinct row is
+    # fitted once.
+    counts, inverse = np.unique(np.asarray(counts, dtype='float64'), axis=0, return_inverse=True)
+
+    def loglik(log_sigma):
+        mass = band_integrals(np.exp(log_sigma), edges, key)
+        p = mass / mass.sum(axis=1, keepdims=True)
+        return (counts * np.log(np.maximum(p, 1e-300))).sum(axis=1)
+
+    return maximize_bounded(loglik, len(counts), LOG_SIGMA_BOUNDS)[inverse.ravel()]
+
+
+def effective_area(log_sigma, key='half-normal', truncation=EDGES[-1]):
+    # Effective detection area (m^2) of one point: 2 pi integral_0^w r g(r) dr
+    return 2 * np.pi * band_integrals(np.exp(log_sigma), np.array([0.0, truncation]), key)[:, 0]
+
+
+def _fit_densities(counts, points, key):
+    # counts: (..., species, bands) detections for `points` point visits. Species under
+    # MIN_DETECTIONS borrow the pooled fit. Returns (log sigma, pooled, birds per hectare)
+    n = counts.sum(axis=-1)
+    shape = counts.shape[:-1]
+    own = fit_scale(counts.reshape(-1, counts.shape[-1]), key=key).reshape(shape)
+    pooled_fit = fit_scale(counts.sum(axis=-2).reshape(-1, counts.shape[-1]), key=key).reshape(shape[:-1])
+    pooled = n < MIN_DETECTIONS
+    log_sigma = np.where(pooled, pooled_fit[..., None], own)
+    area = effective_area(log_sigma.ravel(), key).reshape(shape)
+    return log_sigma, pooled, n / (points * area) * 10_000
+
+
+def point_counts(df):
+    # (point visits x species x bands) detections, species labels and years of each point visit.
+    # Flyovers and detections without a distance band are left out; every survey still counts
+    # towards effort.
+    points, point_index = pd.factorize(pd.MultiIndex.from_arrays([df[col] for col in POINT_COLUMNS]))
+    species_codes, species = pd.factorize(df['common_name'], sort=True)
+    band = pd.Index(list(DISTANCE_BANDS)).get_indexer(df['distance'].astype(object))
+    keep = (points >= 0) & (species_codes >= 0) & (band >= 0)
+    if 'flyover_observed' in df.columns:
+        keep &= df['flyover_observed'].astype(str).str.lower().to_numpy() != 'true'
+    n_points, n_species, n_bands = len(point_index), len(species), len(DISTANCE_BANDS)
+    flat = (points[keep] * n_species + species_codes[keep]) * n_bands + band[keep]
+    counts = np.bincount(flat, minlength=n_points * n_species * n_bands).reshape(n_points, n_species, n_bands)
+    years = pd.Series(df['year'].to_numpy()).groupby(points).first().reindex(range(n_points)).to_numpy()
+    return counts, pd.Index(species), years
+
+
+def park_density(df, key='half-normal', n_boot=N_BOOT, seed=0):
+    # Density per species and year for one park. CIs resample the year's point visits with
+    # replacement; all bootstrap replicates and species are fitted in one batched search.
+    counts, species, years = point_counts(df)
+    rng = np.random.default_rng(seed)
+    rows = []
+    for year in np.unique(years[~pd.isna(years)]):
+        in_year = counts[years == year]
+        n_points = len(in_year)
+        log_sigma, pooled, density = _fit_densities(in_year.sum(axis=0), n_points, key)
+        weights = rng.multinomial(n_points, np.full(n_points, 1 / n_points), size=n_boot)
+        replicates = (weights @ in_year.reshape(n_points, -1)).reshape(n_boot, *in_year.shape[1:])
+        boot = _fit_densities(replicates.astype('float64'), n_points, key)[2]
+        detected = in_year.sum(axis=(0, 2)) > 0
+        rows.append(pd.DataFrame({
+            'year': int(year), 'species': species, 'points': n_points,
+            'detections': in_year.sum(axis=(0, 2)), 'key': key, 'sigma': np.exp(log_sigma), 'pooled': pooled,
+            'density_ha': density, 'lower': np.percentile(boot, 2.5, axis=0),
+            'upper': np.percentile(boot, 97.5, axis=0),
+        })[detected])
+    return pd.concat(rows, ignore_index=True) if rows else pd.DataFrame()
+
+
+def _park_task(args):
+    name, df, key, n_boot, seed = args
+    table = park_density(df, key, n_boot, seed)
+    table.insert(0, 'park', name)
+    return table
+
+
+def density_table(frames, key='half-normal', n_boot=N_BOOT, seed=0, workers=None):
+    # frames: {(habitat, park): stored frame}; parks run as separate tasks, each with its own
+    # child seed so the result does not depend on the worker count
+    columns = POINT_COLUMNS + ['year', 'common_name', 'distance', 'flyover_observed']
+    seeds = np.random.SeedSequence(seed).spawn(len(frames))
+    tasks = [(f"{habitat}-{park}", df[[col for col in columns if col in df.columns]], key, n_boot, child)
+             for ((habitat, park), df), child in zip(frames.items(), seeds)]
+    if workers == 1 or len(tasks) < 2:
+        tables = [_park_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            tables = list(pool.map(_park_task, tasks))
+    return pd.concat(tables, ignore_index=True)
+
+
+def density(key='half-normal', n_boot=N_BOOT, seed=0, files=None, workers=None):
+    # Density table for every park, cached per combined dataset version
+    frames, version = dataset_frames(files or all_data_files())
+
+    def compute():
+        with span('density_fit', rows_in=sum(len(df) for df in frames.values())) as stage:
+            table = density_table(frames, key, n_boot, seed, workers)
+            stage.rows_out = len(table)
+        return table
+
+    return DENSITY_CACHE.get_or_compute('density', version, {'key': key, 'n_boot': n_boot, 'seed': seed}, compute)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distance-sampling density (birds/ha) per species, park and year.")
+    parser.add_argument('--key', choices=KEYS, default='half-normal', help="detection function")
+    parser.add_argument('--boot', type=int, default=N_BOOT)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--output', help="write the full table to this CSV")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    table = density(args.key, args.boot, args.seed, workers=args.workers)
+    elapsed = time.perf_counter() - start
+    print(table.sort_values('density_ha', ascending=False).head(args.top).round(3).to_string(index=False))
+    print(f"\n{len(table)} species x park x year estimates, {args.boot} bootstrap replicates, {elapsed:.2f}s")
+    if args.output:
+        table.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
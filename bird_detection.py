@@ -0,0 +1,177 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from bird_data import all_data_files, parse_data_file
+from bird_ingest import ingest_park
+from bird_quality import QUALITY_SCHEMA
+from bird_store import ParkStore, park_lock, replace_atomically
+
+INTERVALS = QUALITY_SCHEMA['categories']['interval_length']
+HISTORY_FILE = 'detections.npz'
+VISIT_HISTORY_FILE = 'detections_visits.npz'
+CHUNK_ROWS = 1_000_000
+# Above this many cells the tensor is kept as its sorted non-zero cell indices only
+DENSE_MAX_CELLS = 64 * 1024 * 1024
+
+
+class DetectionHistory:
+    """Species x site x visit (x interval) detections; a site is one plot in one year."""
+
+    def __init__(self, shape, cells, surveyed, species, sites, intervals, extra=None):
+        self.shape = shape
+        self.cells = cells
+        self.surveyed = surveyed
+        self.species = species
+        self.sites = sites
+        self.intervals = intervals
+        self.extra = extra or {}
+
+    @property
+    def n_visits(self):
+        return self.shape[2]
+
+    def dense(self):
+        # uint8 0/1 tensor; cells of site-visits that were never surveyed are 0 here and
+        # told apart by surveyed (sites x visits)
+        tensor = np.zeros(int(np.prod(self.shape)), dtype=np.uint8)
+        tensor[self.cells] = 1
+        return tensor.reshape(self.shape)
+
+    def save(self, path, **extra):
+        # Compact binary layout: sorted cell indices stored as gaps (small integers that
+        # compress well), the survey mask as packed bits and labels as fixed-width strings
+        gaps = np.diff(self.cells, prepend=0)
+        gap_dtype = np.uint32 if not len(gaps) or gaps.max() < 2 ** 32 else np.uint64
+
+        def write(tmp):
+            np.savez_compressed(
+                tmp, shape=np.array(self.shape, dtype=np.int64), gaps=gaps.astype(gap_dtype),
+                surveyed=np.packbits(self.surveyed, axis=None), species=np.array(self.species, dtype=str),
+                site_plot=self.sites['plot_name'].to_numpy(dtype=str), site_year=self.sites['year'].to_numpy(),
+                intervals=np.array(self.intervals or [], dtype=str), **extra)
+        replace_atomically(path, write, suffix='.npz')
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            shape = tuple(int(n) for n in data['shape'])
+            cells = np.cumsum(data['gaps'], dtype=np.int64)
+            n_surveyed = shape[1] * shape[2]
+            surveyed = np.unpackbits(data['surveyed'], count=n_surveyed).astype(bool).reshape(shape[1], shape[2])
+            sites = pd.DataFrame({'plot_name': data['site_plot'].astype(object), 'year': data['site_year']})
+            intervals = list(data['intervals']) if len(shape) == 4 else None
+            extra = {key: data[key] for key in data.files if key not in
+                     ('shape', 'gaps', 'surveyed', 'species', 'site_plot', 'site_year', 'intervals')}
+            return cls(shape, cells, surveyed, pd.Index(data['species'].astype(object)), sites, intervals, extra)
+
+
+def _chunks(store, columns, chunk_rows):
+    # Row ranges of the memory-mapped store columns, so memory stays bounded by chunk_rows
+    mapped = {col: store.column(col) for col in columns}
+    for start in range(0, store.rows, chunk_rows):
+        yield {col: np.asarray(values[start:start + chunk_rows]) for col, values in mapped.items()}
+
+
+def detection_history(store, intervals=True, chunk_rows=CHUNK_ROWS):
+    # Two chunked passes over the store columns: the first finds which (plot, year) sites and
+    # visits exist, the second scatters every detection into its flat cell index.
+    columns = ['common_name', 'plot_name', 'year', 'visit'] + (['interval_length'] if intervals else [])
+    species = pd.Index(store.dictionary('common_name'), dtype=object)
+    plots = store.dictionary('plot_name')
+    years = store.column('year')
+    year_min = int(years.min()) if store.rows else 0
+    n_years = int(years.max()) - year_min + 1 if store.rows else 1
+    visit_values = store.column('visit')
+    n_visits = int(np.nanmax(visit_values)) if store.rows and np.isfinite(visit_values).any() else 0
+    interval_codes = (pd.Index(INTERVALS).get_indexer(store.dictionary('interval_length'))
+                      if intervals and store.rows else None)
+
+    def keys(chunk):
+        visit = np.nan_to_num(chunk['visit'], nan=0).astype(np.int64) - 1
+        unit = chunk['plot_name'].astype(np.int64) * n_years + (chunk['year'].astype(np.int64) - year_min)
+        keep = (chunk['plot_name'] >= 0) & (visit >= 0) & (visit < n_visits)
+        return unit, visit, keep
+
+    # Pass 1: surveyed (site, visit) pairs over the dense plot x year grid
+    grid = np.zeros((len(plots) * n_years, max(n_visits, 1)), dtype=bool)
+    for chunk in _chunks(store, columns, chunk_rows):
+        unit, visit, keep = keys(chunk)
+        grid[unit[keep], visit[keep]] = True
+    present = grid.any(axis=1)
+    site_of = np.cumsum(present) - 1
+    n_sites = int(present.sum())
+    site_units = np.flatnonzero(present)
+    sites = pd.DataFrame({'plot_name': np.asarray(plots, dtype=object)[site_units // n_years],
+                          'year': (site_units % n_years + year_min).astype('int16')})
+    surveyed = grid[present, :n_visits]
+
+    shape = (len(species), n_sites, n_visits) + ((len(INTERVALS),) if intervals else ())
+    n_cells = int(np.prod(shape))
+    dense = np.zeros(n_cells, dtype=bool) if n_cells <= DENSE_MAX_CELLS else None
+    parts = []
+    # Pass 2: scatter detections (flat index assignment is idempotent, so repeats are harmless)
+    for chunk in _chunks(store, columns, chunk_rows):
+        unit, visit, keep = keys(chunk)
+        keep &= chunk['common_name'] >= 0
+        flat = (chunk['common_name'].astype(np.int64) * n_sites + site_of[unit.clip(0)]) * n_visits + visit
+        if intervals:
+            interval = interval_codes[chunk['interval_length'].clip(0)]
+            keep &= (chunk['interval_length'] >= 0) & (interval >= 0)
+            flat = flat * len(INTERVALS) + interval
+        if dense is not None:
+            dense[flat[keep]] = True
+        else:
+            parts.append(np.unique(flat[keep]))
+    if dense is not None:
+        cells = np.flatnonzero(dense)
+    else:
+        cells = np.unique(np.concatenate(parts)) if parts else np.zeros(0, np.int64)
+    return DetectionHistory(shape, cells.astype(np.int64), surveyed, species, sites,
+                            list(INTERVALS) if intervals else None)
+
+
+def park_history(path, intervals=True, root=None):
+    # Detection history of one park, saved next to its store and rebuilt when the store changes.
+    # Held under the park's 'detections' lock (taken before ingest_park's) so writers don't race.
+    habitat, park = parse_data_file(path)
+    with park_lock(habitat, park, root, name='detections'):
+        ingest_park(path, root)
+        store = ParkStore(habitat, park, root)
+        history_path = os.path.join(store.path, HISTORY_FILE if intervals else VISIT_HISTORY_FILE)
+        version = store.batches_signature()
+        if os.path.exists(history_path):
+            history = DetectionHistory.load(history_path)
+            if str(history.extra.get('version', '')) == version:
+                return history
+        history = detection_history(store, intervals)
+        history.save(history_path, version=np.array(version))
+        return history
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build species x site x visit x interval detection histories.")
+    parser.add_argument('--parks', help="comma separated park codes (default: all)")
+    parser.add_argument('--no-intervals', action='store_true', help="collapse the four count intervals")
+    parser.add_argument('--output-dir', help="also write each park's history here as <HABITAT>-<PARK>.npz")
+    args = parser.parse_args()
+
+    parks = set(args.parks.split(',')) if args.parks else None
+    for (habitat, park), path in sorted(all_data_files().items()):
+        if parks is not None and park not in parks or not (os.path.exists(path) or ParkStore(habitat, park).rows):
+            continue
+        start = time.perf_counter()
+        history = park_history(path, not args.no_intervals)
+        elapsed = time.perf_counter() - start
+        print(f"{habitat}-{park}: shape {history.shape}, {len(history.cells):,} detections, "
+              f"{int(history.surveyed.sum())} surveyed site-visits, {elapsed:.2f}s")
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+            history.save(os.path.join(args.output_dir, f"{habitat}-{park}.npz"))
+
+
+if __name__ == "__main__":
+    main()
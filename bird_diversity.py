@@ -0,0 +1,171 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from bird_data import all_data_files, parse_data_file, shared_observations
+from filter_cache import FilterCache
+from perf_spans import span
+
+# Grouping columns per level; every level can also be split by year
+LEVELS = {
+    'plot': ['habitat', 'park', 'site_name', 'plot_name'],
+    'site': ['habitat', 'park', 'site_name'],
+    'park': ['habitat', 'park'],
+    'habitat': ['habitat'],
+}
+UNIT_COLUMNS = ['habitat', 'park', 'site_name', 'plot_name', 'year']
+
+# Matrices and index tables for the whole dataset, keyed by the combined dataset version
+DIVERSITY_CACHE = FilterCache(max_entries=32, max_bytes=128 * 1024 * 1024, ttl=24 * 3600)
+
+
+class AbundanceMatrix:
+    """Sparse unit x species detection counts; a unit is one plot in one year."""
+
+    def __init__(self, matrix, units, species):
+        self.matrix = matrix
+        self.units = units
+        self.species = species
+
+
+def _codes(values):
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(dtype='int64'), values.cat.categories
+    codes, labels = pd.factorize(values)
+    return codes.astype('int64'), pd.Index(labels)
+
+
+def _labels(categories, codes):
+    labels = np.asarray(categories, dtype=object)
+    out = labels.take(np.maximum(codes, 0)) if len(labels) else np.full(len(codes), None, dtype=object)
+    out[codes < 0] = None
+    return out
+
+
+def abundance_matrix(frames, weights=None):
+    # frames: {(habitat, park): stored frame}. Each observation row is one detection unless
+    # weights names a column to sum instead.
+    species = pd.Index(sorted(set().union(*[_codes(df['common_name'])[1] for df in frames.values()])))
+    unit_parts, rows, cols, values = [], [], [], []
+    n_units = 0
+    for (habitat, park), df in frames.items():
+        # Grassland exports have no Site_Name; their plots fall under a missing site
+        site_codes, sites = _codes(df['site_name'] if 'site_name' in df.columns
+                                   else pd.Series(None, index=df.index, dtype=object))
+        plot_codes, plots = _codes(df['plot_name'])
+        name_codes, names = _codes(df['common_name'])
+        years = df['year'].to_numpy(dtype='int64')
+        keep = name_codes >= 0
+        year_min = int(years.min()) if len(years) else 0
+        year_span = int(years.max()) - year_min + 1 if len(years) else 1
+        n_plot = len(plots) + 1
+        # One integer key per (site, plot, year); missing site/plot codes (-1) shift to 0
+        key = ((site_codes + 1) * n_plot + plot_codes + 1) * year_span + (years - year_min)
+        unique_keys, inverse = np.unique(key[keep], return_inverse=True)
+        unit_parts.append(pd.DataFrame({
+            'habitat': habitat,
+            'park': park,
+            'site_name': _labels(sites, unique_keys // year_span // n_plot - 1),
+            'plot_name': _labels(plots, unique_keys // year_span % n_plot - 1),
+            'year': (unique_keys % year_span + year_min).astype('int16'),
+        }))
+
+        rows.append(inverse + n_units)
+        cols.append(species.get_indexer(names)[name_codes[keep]])
+        values.append(np.ones(int(keep.sum())) if weights is None
+                      else np.nan_to_num(df[weights].to_numpy(dtype='float64')[keep]))
+        n_units += len(unique_keys)
+
+    matrix = sp.csr_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))),
+                           shape=(n_units, len(species)))
+    matrix.sum_duplicates()
+    matrix.eliminate_zeros()
+    units = pd.concat(unit_parts, ignore_index=True) if unit_parts else pd.DataFrame(columns=UNIT_COLUMNS)
+    return AbundanceMatrix(matrix, units, species)
+
+
+def diversity_indices(matrix):
+    # Richness, Shannon H' (natural log), Gini-Simpson 1 - sum(p^2) and Pielou evenness H'/ln(S)
+    # for every row of a CSR abundance matrix, computed over its non-zeros only
+    n = matrix.shape[0]
+    totals = np.asarray(matrix.sum(axis=1)).ravel()
+    richness = np.diff(matrix.indptr)
+    row_of = np.repeat(np.arange(n), richness)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = matrix.data / totals[row_of]
+        shannon = -np.bincount(row_of, weights=p * np.log(p), minlength=n)
+        simpson = 1 - np.bincount(row_of, weights=p * p, minlength=n)
+        evenness = np.where(richness > 1, shannon / np.log(np.maximum(richness, 2)), np.nan)
+    simpson[totals == 0] = np.nan
+    return pd.DataFrame({'detections': totals, 'richness': richness, 'shannon': shannon + 0.0,
+                         'simpson': simpson, 'evenness': evenness})
+
+
+def group_matrix(abundance, keys):
+    # Sum unit rows into groups of the key columns with one sparse indicator product;
+    # returns (group labels, group x species CSR)
+    units = abundance.units
+    groups = units.groupby(keys, sort=True, dropna=False).ngroup().to_numpy()
+    labels = units[keys].drop_duplicates().sort_values(keys, na_position='last').reset_index(drop=True)
+    indicator = sp.csr_matrix((np.ones(len(units)), (groups, np.arange(len(units)))),
+                              shape=(len(labels), len(units)))
+    return labels, (indicator @ abundance.matrix).tocsr()
+
+
+def diversity_table(abundance, level='plot', by_year=True):
+    labels, matrix = group_matrix(abundance, LEVELS[level] + (['year'] if by_year else []))
+    return pd.concat([labels, diversity_indices(matrix)], axis=1)
+
+
+def dataset_frames(files):
+    # Every park's stored frame and one version string for the combination
+    frames, versions = {}, []
+    for key, path in sorted(files.items()):
+        frames[key], version = shared_observations(path)
+        versions.append(version)
+    return frames, hashlib.sha1(','.join(versions).encode()).hexdigest()[:16]
+
+
+def cached_abundance(files=None):
+    # The all-park abundance matrix and its combined dataset version
+    frames, version = dataset_frames(files or all_data_files())
+
+    def compute():
+        with span('diversity_matrix', rows_in=sum(len(df) for df in frames.values())) as stage:
+            abundance = abundance_matrix(frames)
+            stage.rows_out = abundance.matrix.shape[0]
+        return abundance
+
+    return DIVERSITY_CACHE.get_or_compute('abundance', version, {}, compute), version
+
+
+def diversity(level='plot', by_year=True, files=None):
+    # Index table for every park's groups at a level, cached per combined dataset version
+    abundance, version = cached_abundance(files)
+
+    def compute_table():
+        with span('diversity_indices', rows_in=abundance.matrix.shape[0]) as stage:
+            table = diversity_table(abundance, level, by_year)
+            stage.rows_out = len(table)
+        return table
+
+    return DIVERSITY_CACHE.get_or_compute('diversity', version, {'level': level, 'by_year': by_year}, compute_table)
+
+
+def render_diversity_panel(container, dataset):
+    # One park's plots/sites next to its park-wide figures; built from the all-park tables
+    habitat, park = parse_data_file(dataset)
+    controls = container.columns(2)
+    level = controls[0].selectbox("Diversity level", ['plot', 'site', 'park'], index=1, key='diversity_level')
+    by_year = controls[1].checkbox("Split by year", value=False, key='diversity_by_year')
+    table = diversity(level, by_year)
+    rows = table[(table['habitat'] == habitat) & (table['park'] == park)]
+    overall = diversity('park', False)
+    overall = overall[(overall['habitat'] == habitat) & (overall['park'] == park)]
+    if len(overall):
+        row = overall.iloc[0]
+        container.caption(f"{park} overall: {int(row['richness'])} species, Shannon {row['shannon']:.2f}, "
+                          f"Simpson {row['simpson']:.3f}, evenness {row['evenness']:.2f}")
+    container.dataframe(rows.drop(columns=['habitat']).round(3), hide_index=True)
@@ -0,0 +1,163 @@
+import argparse
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+from bird_data import DATE_DIMENSION, all_data_files, data_file
+from bird_filters import filter_mask
+from bird_ingest import ingest_park, park_source
+from bird_store import ParkStore
+
+EXPORT_CHUNK_ROWS = 100_000
+INTEGER_COLUMNS = ['year', 'visit', 'acceptedtsn', 'npstaxoncode', 'taxoncode']
+NUMERIC_COLUMNS = ['initial_three_min_cnt', 'temperature', 'humidity', 'is_duplicate']
+# Derived at ingest for filtering; the export keeps the source columns (year included)
+DERIVED_COLUMNS = [col for col in DATE_DIMENSION if col != 'year']
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+
+def _normalize_chunk(chunk, columns):
+    # Fix every column's type up front so chunks from different files share one schema
+    chunk = chunk.reindex(columns=columns)
+    out = {}
+    for col in columns:
+        if col == 'date':
+            out[col] = pd.to_datetime(chunk[col])
+        elif col in INTEGER_COLUMNS:
+            out[col] = pd.to_numeric(chunk[col], errors='coerce').astype('Int64')
+        elif col in NUMERIC_COLUMNS:
+            out[col] = pd.to_numeric(chunk[col], errors='coerce').astype('float64')
+        else:
+            out[col] = chunk[col].astype('string')
+    return pd.DataFrame(out, index=chunk.index)
+
+
+def park_stores(files, root=None):
+    # Every park's store, brought up to date from whichever source (CSV or workbook) feeds it.
+    # Rows come from the store, so the export matches the deduped rows the dashboards show.
+    stores = {}
+    for (habitat, park), path in files.items():
+        if os.path.exists(park_source(path, root)):
+            ingest_park(path, root)
+        store = ParkStore(habitat, park, root)
+        if store.rows:
+            stores[(habitat, park)] = store
+    return stores
+
+
+def filtered_chunks(spec, stores, chunk_rows=EXPORT_CHUNK_ROWS):
+    # stores: {(habitat, park): ParkStore}; yields matching rows tagged with habitat and park
+    for (habitat, park), store in stores.items():
+        for start in range(0, store.rows, chunk_rows):
+            chunk = store.read_frame(start=start, stop=start + chunk_rows)
+            chunk = chunk[filter_mask(chunk, spec)]
+            if len(chunk):
+                chunk.insert(0, 'habitat', habitat)
+                chunk.insert(1, 'park', park)
+                yield chunk
+
+
+def _column_union(stores):
+    columns = ['habitat', 'park']
+    for store in stores.values():
+        for col in store.manifest['columns']:
+            if col not in columns and col not in DERIVED_COLUMNS:
+                columns.append(col)
+    return columns
+
+
+def write_csv(chunks, out, columns):
+    rows = 0
+    out.write(','.join(columns).encode() + b'\n')
+    for chunk in chunks:
+        out.write(_normalize_chunk(chunk, columns).to_csv(index=False, header=False).encode())
+        rows += len(chunk)
+    return rows
+
+
+def write_parquet(chunks, out, columns):
+    if pq is None:
+        raise RuntimeError("Parquet export requires pyarrow")
+    rows = 0
+    # The schema comes from an empty normalized frame, so a filter that matches nothing still
+    # writes a readable file with every column
+    empty = pa.Table.from_pandas(_normalize_chunk(pd.DataFrame(columns=columns), columns), preserve_index=False)
+    schema = empty.schema
+    with pq.ParquetWriter(out, schema) as writer:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(_normalize_chunk(chunk, columns), preserve_index=False)
+            writer.write_table(table.cast(schema))
+            rows += len(chunk)
+        if not rows:
+            writer.write_table(empty)
+    return rows
+
+
+def export(spec, files, out, fmt='csv', chunk_rows=EXPORT_CHUNK_ROWS):
+    stores = park_stores(files)
+    columns = _column_union(stores)
+    chunks = filtered_chunks(spec, stores, chunk_rows)
+    if fmt == 'csv':
+        return write_csv(chunks, out, columns)
+    if fmt == 'parquet':
+        return write_parquet(chunks, out, columns)
+    raise ValueError(f"Unknown export format: {fmt}")
+
+
+def spooled_export(spec, files, fmt='csv'):
+    # For download buttons: large exports spill to disk instead of memory
+    spool = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024, mode='w+b')
+    export(spec, files, spool, fmt)
+    spool.seek(0)
+    return spool
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream filtered bird observations to CSV or Parquet.")
+    parser.add_argument('--park', help="park code, e.g. CHOH (default: all parks)")
+    parser.add_argument('--habitat', choices=['FOREST', 'GRASSLAND'], help="default: both habitats")
+    parser.add_argument('--year', type=int)
+    parser.add_argument('--species')
+    parser.add_argument('--species-field', default='common_name', choices=['common_name', 'full_name'])
+    parser.add_argument('--interval')
+    parser.add_argument('--id-method')
+    parser.add_argument('--date-range', nargs=2, metavar=('START', 'END'))
+    parser.add_argument('--temp-range', nargs=2, type=float, metavar=('MIN', 'MAX'))
+    parser.add_argument('--hum-range', nargs=2, type=float, metavar=('MIN', 'MAX'))
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    parser.add_argument('--chunk-rows', type=int, default=EXPORT_CHUNK_ROWS)
+    parser.add_argument('-o', '--output', required=True, help="output file, or - for stdout (CSV only)")
+    args = parser.parse_args()
+
+    files = {key: path for key, path in all_data_files().items()
+             if (args.park is None or key[1] == args.park) and (args.habitat is None or key[0] == args.habitat)}
+    if not files:
+        parser.error(f"No data file for {data_file(args.park, args.habitat or 'FOREST')}")
+
+    spec = {
+        'year': args.year,
+        'species': args.species,
+        'species_field': args.species_field,
+        'interval': args.interval,
+        'id_method': args.id_method,
+        'date_range': args.date_range,
+        'temp_range': args.temp_range,
+        'hum_range': args.hum_range,
+    }
+    if args.output == '-':
+        rows = export(spec, files, sys.stdout.buffer, args.format, args.chunk_rows)
+    else:
+        with open(args.output, 'wb') as out:
+            rows = export(spec, files, out, args.format, args.chunk_rows)
+    print(f"Exported {rows} rows from {len(files)} file(s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import datetime
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from perf_spans import span
+
+# Filter spec shared by the dashboards: a plain dict with any of
+#   park, year, species, species_field, interval, id_method,
+#   date_range, temp_range, hum_range
+# Missing or None entries mean "no filter".
+RANGE_KEYS = ('date_range', 'temp_range', 'hum_range')
+
+
+def _normalize_value(value):
+    if isinstance(value, (pd.Timestamp, datetime.date)):
+        return pd.Timestamp(value).date().isoformat()
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        value = float(value)
+        return int(value) if value.is_integer() else value
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize_value(v) for v in value)
+    return value
+
+
+def normalize_spec(spec):
+    items = []
+    for key, value in spec.items():
+        if value is None:
+            continue
+        if key in RANGE_KEYS and len(value) != 2:
+            continue
+        items.append((key, _normalize_value(value)))
+    if dict(items).get('species_field') == 'common_name':
+        items = [item for item in items if item[0] != 'species_field']
+    return tuple(sorted(items))
+
+
+def spec_key(spec, version=''):
+    payload = repr((version, normalize_spec(spec))).encode()
+    return hashlib.sha1(payload).hexdigest()
+
+
+def filter_mask(df, spec):
+    mask = np.ones(len(df), dtype=bool)
+
+    if spec.get('year') is not None:
+        # Stored frames carry an int16 year; raw chunks still have the source Year column
+        years = df['year'] if 'year' in df.columns else df['date'].dt.year
+        mask &= (years == spec['year']).to_numpy()
+
+    if spec.get('species') is not None:
+        species_field = spec.get('species_field') or 'common_name'
+        mask &= (df[species_field] == spec['species']).to_numpy()
+
+    if spec.get('interval') is not None and 'interval_length' in df.columns:
+        mask &= (df['interval_length'].astype(str) == spec['interval']).to_numpy()
+
+    if spec.get('id_method') is not None and 'id_method' in df.columns:
+        mask &= (df['id_method'].astype(str) == spec['id_method']).to_numpy()
+
+    date_range = spec.get('date_range')
+    if date_range is not None and len(date_range) == 2:
+        start, end = pd.to_datetime(date_range[0]), pd.to_datetime(date_range[1])
+        if 'day_number' in df.columns:
+            first, last = (np.datetime64(bound.date(), 'D').astype('int64') for bound in (start, end))
+            days = df['day_number'].to_numpy()
+            mask &= (days >= first) & (days <= last)
+        else:
+            mask &= ((df['date'] >= start) & (df['date'] <= end)).to_numpy()
+
+    for key, col in [('temp_range', 'temperature'), ('hum_range', 'humidity')]:
+        bounds = spec.get(key)
+        if bounds is not None and col in df.columns:
+            mask &= df[col].between(bounds[0], bounds[1]).to_numpy()
+
+    return mask
+
+
+def filter_positions(df, spec):
+    with span('filter', rows_in=len(df)) as stage:
+        positions = np.flatnonzero(filter_mask(df, spec))
+        stage.rows_out = len(positions)
+    return positions
+
+
+def apply_filters(df, spec):
+    return df.iloc[filter_positions(df, spec)]
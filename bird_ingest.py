@@ -0,0 +1,167 @@
+import argparse
+import hashlib
+import io
+import os
+import time
+
+import pandas as pd
+
+from bird_data import add_date_dimension, all_data_files, dataset_version, parse_data_file, workbook_file
+from bird_dedupe import DEDUPE_MODE, store_deduper
+from bird_quality import checked_observations
+from bird_store import ParkStore, park_lock
+from bird_xlsx import ingest_workbook
+from perf_spans import span
+
+# Bytes just before the watermark that must be unchanged for an append-only resume
+TAIL_BYTES = 64 * 1024
+
+
+def _sha1(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def _read_range(path, start, stop):
+    with open(path, 'rb') as fh:
+        fh.seek(start)
+        return fh.read(stop - start)
+
+
+def _read_header(path):
+    with open(path, 'rb') as fh:
+        header = fh.readline()
+    return header if header.endswith(b'\n') else header + b'\n'
+
+
+def _can_resume(store, path, header, size, verify):
+    if not store.manifest or not store.manifest['batches']:
+        return False
+    last = store.manifest['batches'][-1]
+    if last.get('source', 'csv') != 'csv':
+        return False
+    if DEDUPE_MODE != 'off' and store.row_hashes() is None:
+        # Stored rows predate dedupe hashing, so new rows could not be checked against them
+        return False
+    offset = last['offset_end']
+    if offset > size or last['header_hash'] != _sha1(header):
+        return False
+    if offset == size:
+        # Nothing appended: any change at all means rows were edited in place
+        return last['file_version'] == dataset_version(path)
+    if last['tail_hash'] != _sha1(_read_range(path, max(len(header), offset - TAIL_BYTES), offset)):
+        return False
+    if verify:
+        # Rehash every ingested byte range and compare against the chained content hash
+        chain = ''
+        for batch in store.manifest['batches']:
+            chain = _sha1((chain + _sha1(_read_range(path, batch['offset_start'], batch['offset_end']))).encode())
+        return chain == last['content_hash']
+    return True
+
+
+def ingest(path, root=None, verify=False, rebuild=False):
+    # Bring the park's store up to date with path; only bytes past the watermark are parsed
+    habitat, park = parse_data_file(path)
+    store = ParkStore(habitat, park, root)
+    header = _read_header(path)
+    size = os.path.getsize(path)
+
+    if not rebuild and _can_resume(store, path, header, size, verify):
+        offset = store.manifest['batches'][-1]['offset_end']
+        chain = store.manifest['batches'][-1]['content_hash']
+    else:
+        store.reset()
+        offset, chain = len(header), ''
+    if offset >= size:
+        return 0
+
+    with span('ingest_read', rows_in=None) as stage:
+        delta = _read_range(path, offset, size)
+        # The exports end without a trailing newline, so appended rows start with one
+        body = delta.lstrip(b'\r\n')
+        raw = pd.read_csv(io.BytesIO(header + body)) if body.strip() else pd.DataFrame()
+        stage.rows_out = len(raw)
+    if raw.empty:
+        return 0
+
+    with span('ingest_clean', rows_in=len(raw)) as stage:
+        df, quality = checked_observations(raw)[:2]
+        stage.rows_out = len(df)
+
+    hashes, duplicates = None, 0
+    deduper = store_deduper(store)
+    if deduper is not None:
+        with span('dedupe', rows_in=len(df)) as stage:
+            df, hashes = deduper.apply(df)
+            duplicates = deduper.duplicates
+            stage.rows_out = len(df)
+
+    with span('ingest_append', rows_in=len(df)):
+        df = add_date_dimension(df)
+        store.append(df, {
+            'source': 'csv',
+            'offset_start': offset,
+            'offset_end': size,
+            'source_rows': len(raw),
+            'duplicates': duplicates,
+            'quality': quality,
+            'header_hash': _sha1(header),
+            'tail_hash': _sha1(_read_range(path, max(len(header), size - TAIL_BYTES), size)),
+            'content_hash': _sha1((chain + _sha1(delta)).encode()),
+            'file_version': dataset_version(path),
+            'ingested_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }, hashes)
+    return len(df)
+
+
+def park_source(path, root=None):
+    # A park stays fed from its workbook once ingested from it, or when its CSV was never exported
+    habitat, park = parse_data_file(path)
+    workbook = workbook_file(habitat)
+    if not os.path.exists(workbook):
+        return path
+    manifest = ParkStore(habitat, park, root).manifest
+    from_workbook = bool(manifest and manifest['batches'] and manifest['batches'][-1].get('source') == 'xlsx')
+    return workbook if from_workbook or not os.path.exists(path) else path
+
+
+def source_version(path, root=None):
+    return dataset_version(park_source(path, root))
+
+
+def ingest_park(path, root=None):
+    # Every reader that brings a store up to date goes through here, so two sessions or
+    # processes never append the same batch twice
+    habitat, park = parse_data_file(path)
+    with park_lock(habitat, park, root):
+        source = park_source(path, root)
+        if source == path:
+            return ingest(path, root)
+        return ingest_workbook(source, parks=[park], root=root)[park]
+
+
+def stored_observations(path, root=None):
+    ingest_park(path, root)
+    habitat, park = parse_data_file(path)
+    with span('store_read') as stage:
+        df = ParkStore(habitat, park, root).read_frame()
+        stage.rows_out = len(df)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Append new survey rows from the park CSVs to the columnar store.")
+    parser.add_argument('files', nargs='*', help="park CSVs (default: every park)")
+    parser.add_argument('--verify', action='store_true', help="rehash all ingested bytes before resuming")
+    parser.add_argument('--rebuild', action='store_true', help="discard the stored data and ingest from scratch")
+    args = parser.parse_args()
+
+    for path in args.files or all_data_files().values():
+        start = time.perf_counter()
+        with park_lock(*parse_data_file(path)):
+            rows = ingest(path, verify=args.verify, rebuild=args.rebuild)
+        print(f"{os.path.basename(path)}: {rows} new rows in {time.perf_counter() - start:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from bird_cooccurrence import visit_keys
+from bird_data import all_data_files, parse_data_file
+from bird_ingest import ingest_park
+from bird_store import ParkStore
+from perf_spans import span
+
+# Species x date (or x survey visit) count matrices exported as raw .npy buffers so any number of
+# processes can np.load(..., mmap_mode='r') them and share the pages:
+#   <dir>/meta.json                           shape, row kind, parks and their store signatures
+#   <dir>/{csr,csc}_{indptr,indices,data}.npy  both compressed layouts of the same counts
+#   <dir>/row_park.npy, row_date.npy           labels of every row (+ row_plot.npy, row_visit.npy)
+#   <dir>/col_aou.npy, col_name.npy            AOU code and common name of every column
+EXPORT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reports', 'matrix')
+ROW_KINDS = ['date', 'visit']
+INDEX_DTYPE = np.dtype('int32')
+COUNT_DTYPE = np.dtype('int32')
+MATRIX_ARRAYS = ['indptr', 'indices', 'data']
+
+
+def _park_rows(store, rows):
+    # Detections of one park store as (row keys, AOU codes, common names, row labels)
+    aou = np.asarray(store.column('aou_code'))
+    names = np.asarray(store.column('common_name'))
+    days = np.asarray(store.column('day_number'), dtype=np.int64)
+    if rows == 'date':
+        keys = days
+    else:
+        keys = visit_keys(store.column('plot_name'), days, store.column('visit'))
+    keep = (aou >= 0) & (keys >= 0)
+    codes, uniques = pd.factorize(keys[keep], sort=True)
+    if rows == 'date':
+        labels = {'date': uniques.astype('datetime64[D]')}
+    else:
+        # Unpack the visit keys back into plot, date and visit round
+        plots = np.asarray(store.dictionary('plot_name'), dtype=object)
+        labels = {'date': ((uniques >> 8) & 0xFFFFFFFF).astype('datetime64[D]'),
+                  'plot': plots[uniques >> 40].astype(str), 'visit': ((uniques & 0xFF) - 1).astype(np.int8)}
+    aou_labels = np.asarray(store.dictionary('aou_code'), dtype=object)[aou[keep]]
+    name_labels = np.append(np.asarray(store.dictionary('common_name'), dtype=object), '')[names[keep]]
+    return codes, aou_labels, name_labels, labels, len(uniques)
+
+
+def species_matrix(stores, rows='date'):
+    # Counts of detection records for every (row, species) over the given park stores, rows
+    # ordered by park then date/visit. Returns (CSR matrix, row labels, column labels).
+    parts, row_labels, offset = [], {}, 0
+    for store in stores:
+        codes, aou, names, labels, n_rows = _park_rows(store, rows)
+        parts.append((codes + offset, aou, names))
+        labels['park'] = np.full(n_rows, f"{store.habitat}-{store.park}")
+        for key, values in labels.items():
+            row_labels.setdefault(key, []).append(values)
+        offset += n_rows
+    all_aou = np.concatenate([aou for _, aou, _ in parts]) if parts else np.zeros(0, dtype=object)
+    columns, first = np.unique(all_aou.astype(str), return_index=True)
+    all_names = np.concatenate([names for _, _, names in parts]) if parts else np.zeros(0, dtype=object)
+    row = np.concatenate([codes for codes, _, _ in parts]) if parts else np.zeros(0, np.int64)
+    column = np.searchsorted(columns, all_aou.astype(str))
+    matrix = sp.coo_matrix((np.ones(len(row), dtype=COUNT_DTYPE), (row, column)),
+                           shape=(offset, len(columns))).tocsr()
+    matrix.sum_duplicates()
+    row_labels = {key: np.concatenate(values) for key, values in row_labels.items()}
+    col_labels = {'aou': columns, 'name': all_names[first].astype(str)}
+    return matrix, row_labels, col_labels
+
+
+def save_matrix(path, matrix, row_labels, col_labels, meta):
+    # Written to a sibling directory and swapped in, so readers never see a half-written export
+    tmp = path + '.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for fmt, layout in (('csr', matrix.tocsr()), ('csc', matrix.tocsc())):
+        layout.sort_indices()
+        for name, dtype in zip(MATRIX_ARRAYS, (INDEX_DTYPE, INDEX_DTYPE, COUNT_DTYPE)):
+            np.save(os.path.join(tmp, f"{fmt}_{name}.npy"), getattr(layout, name).astype(dtype))
+    for prefix, labels in (('row', row_labels), ('col', col_labels)):
+        for key, values in labels.items():
+            np.save(os.path.join(tmp, f"{prefix}_{key}.npy"), values)
+    with open(os.path.join(tmp, 'meta.json'), 'w') as fh:
+        json.dump({**meta, 'shape': list(matrix.shape), 'nnz': int(matrix.nnz),
+                   'row_labels': sorted(row_labels), 'col_labels': sorted(col_labels)}, fh)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+
+
+def load_matrix(path, fmt='csr'):
+    # Zero-copy load: the index and data buffers stay memory-mapped inside the scipy matrix.
+    # Returns (matrix, row labels, column labels, meta).
+    with open(os.path.join(path, 'meta.json')) as fh:
+        meta = json.load(fh)
+    arrays = [np.load(os.path.join(path, f"{fmt}_{name}.npy"), mmap_mode='r') for name in MATRIX_ARRAYS]
+    layout = sp.csr_matrix if fmt == 'csr' else sp.csc_matrix
+    matrix = layout((arrays[2], arrays[1], arrays[0]), shape=tuple(meta['shape']), copy=False)
+    row_labels = {key: np.load(os.path.join(path, f"row_{key}.npy"), mmap_mode='r') for key in meta['row_labels']}
+    col_labels = {key: np.load(os.path.join(path, f"col_{key}.npy"), mmap_mode='r') for key in meta['col_labels']}
+    return matrix, row_labels, col_labels, meta
+
+
+def export_matrix(paths, rows='date', out_dir=None, root=None):
+    # Export for the given park data files; skipped when the existing export was built from
+    # the same store batches
+    stores = []
+    for path in paths:
+        ingest_park(path, root)
+        stores.append(ParkStore(*parse_data_file(path), root))
+    stores = [store for store in stores if store.rows]
+    out_dir = out_dir or os.path.join(EXPORT_ROOT, rows)
+    parks = {f"{store.habitat}-{store.park}": store.batches_signature() for store in stores}
+    try:
+        with open(os.path.join(out_dir, 'meta.json')) as fh:
+            meta = json.load(fh)
+        if meta.get('rows') == rows and meta.get('parks') == parks:
+            return out_dir, False
+    except FileNotFoundError:
+        pass
+    with span('matrix_export', rows_in=sum(store.rows for store in stores)) as stage:
+        matrix, row_labels, col_labels = species_matrix(stores, rows)
+        save_matrix(out_dir, matrix, row_labels, col_labels, {'rows': rows, 'parks': parks})
+        stage.rows_out = matrix.nnz
+    return out_dir, True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export species x date/visit count matrices as memory-mappable CSR/CSC buffers.")
+    parser.add_argument('--parks', help="comma separated park codes (default: all)")
+    parser.add_argument('--rows', choices=ROW_KINDS, default='date', help="one row per survey date or per visit")
+    parser.add_argument('--output-dir', help=f"export directory (default: {EXPORT_ROOT}/<rows>)")
+    args = parser.parse_args()
+
+    parks = set(args.parks.split(',')) if args.parks else None
+    paths = [path for (habitat, park), path in sorted(all_data_files().items())
+             if (parks is None or park in parks) and (os.path.exists(path) or ParkStore(habitat, park).rows)]
+    start = time.perf_counter()
+    out_dir, built = export_matrix(paths, args.rows, args.output_dir)
+    elapsed = time.perf_counter() - start
+    matrix, row_labels, col_labels, meta = load_matrix(out_dir)
+    print(f"{out_dir}: {matrix.shape[0]} {args.rows} rows x {matrix.shape[1]} species, {matrix.nnz:,} non-zero "
+          f"from {len(meta['parks'])} park(s), {'built' if built else 'up to date'} in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+COUNT_COLUMN = 'initial_three_min_cnt'
+MONTHS = range(1, 13)
+
+
+def _keys(values, span=None):
+    # Small-integer keys index the matrix directly, offset by their minimum (or by span);
+    # categoricals use their codes and anything else is factorized.
+    # Returns (keys, offset, labels, may_fall_outside).
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(), 0, values.cat.categories, True
+    array = values.to_numpy()
+    if array.dtype.kind in 'iu':
+        if span is not None:
+            return array, span[0], pd.RangeIndex(span[0], span[-1] + 1), True
+        low, high = (int(array.min()), int(array.max())) if len(array) else (0, -1)
+        return array, low, pd.RangeIndex(low, high + 1), False
+    codes, labels = pd.factorize(values, sort=True)
+    return codes, 0, pd.Index(labels), True
+
+
+def dense_pivot(rows, cols, weights=None, row_span=None, col_span=None, drop_empty=False):
+    # Sum weights (or count rows) for every (row, col) key pair with one np.bincount
+    # over the flat index row * n_cols + col; returns the labeled dense matrix
+    row_keys, row_offset, row_labels, row_check = _keys(rows, row_span)
+    col_keys, col_offset, col_labels, col_check = _keys(cols, col_span)
+    n_rows, n_cols = len(row_labels), len(col_labels)
+
+    # Built in place to keep allocations to one index-sized array
+    flat = row_keys.astype(np.intp)
+    flat -= row_offset
+    flat *= n_cols
+    flat += col_keys
+    flat -= col_offset
+    if weights is not None:
+        weights = np.asarray(weights, dtype='float64')
+        if np.isnan(weights).any():
+            weights = np.nan_to_num(weights)
+    if row_check or col_check:
+        valid = np.ones(len(flat), dtype=bool)
+        for keys, offset, size, check in ((row_keys, row_offset, n_rows, row_check),
+                                          (col_keys, col_offset, n_cols, col_check)):
+            if check:
+                valid &= (keys >= offset) & (keys < offset + size)
+        if not valid.all():
+            flat = flat[valid]
+            weights = weights[valid] if weights is not None else None
+
+    totals = np.bincount(flat, weights=weights, minlength=n_rows * n_cols).reshape(n_rows, n_cols)
+    matrix = pd.DataFrame(totals, index=row_labels, columns=col_labels)
+    matrix.index.name, matrix.columns.name = rows.name, cols.name
+    if drop_empty:
+        matrix = matrix.loc[matrix.any(axis=1), matrix.any(axis=0)]
+    return matrix
+
+
+def year_month(df, values=COUNT_COLUMN):
+    # Monthly trend heatmap: years down, all twelve months across
+    return dense_pivot(df['year'], df['month'], df[values], col_span=MONTHS)
+
+
+def species_month(df, values=COUNT_COLUMN, species_field='common_name'):
+    return dense_pivot(df[species_field], df['month'], df[values], col_span=MONTHS, drop_empty=True)
+
+
+def park_year(frames, values=COUNT_COLUMN):
+    # frames: {park: stored frame}; the park key is a categorical over the given parks
+    codes = np.repeat(np.arange(len(frames), dtype='int16'), [len(df) for df in frames.values()])
+    parks = pd.Categorical.from_codes(codes, categories=list(frames))
+    years = pd.Series(np.concatenate([df['year'].to_numpy() for df in frames.values()]), name='year')
+    weights = np.concatenate([df[values].to_numpy(dtype='float64') for df in frames.values()])
+    return dense_pivot(pd.Series(parks, name='park'), years, weights)
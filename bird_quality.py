@@ -0,0 +1,153 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from bird_data import all_data_files, clean_columns, drop_incomplete, parse_observations
+
+# Declarative checks evaluated column-at-a-time; every rule name in a report is "<check>:<column>"
+QUALITY_SCHEMA = {
+    'required': ['date', 'common_name', 'initial_three_min_cnt', 'plot_name'],
+    # Values present in the source that the type conversion turned into NaN/NaT
+    'typed': ['date', 'initial_three_min_cnt', 'temperature', 'humidity'],
+    'ranges': {
+        'temperature': (-10, 45),
+        'humidity': (0, 100),
+        'visit': (1, 4),
+    },
+    'categories': {
+        'interval_length': ['0-2.5 min', '2.5 - 5 min', '5 - 7.5 min', '7.5 - 10 min'],
+        'distance': ['<= 50 Meters', '50 - 100 Meters'],
+        'sky': ['Clear or Few Clouds', 'Partly Cloudy', 'Cloudy/Overcast', 'Fog', 'Mist/Drizzle',
+                'Drizzle', 'Rain', 'Snow'],
+        'wind': ['Calm (< 1 mph) smoke rises vertically', 'Light air movement (1-3 mph) smoke drifts',
+                 'Light breeze (4-7 mph) wind felt on face', 'Gentle breeze (8-12 mph), leaves in motion',
+                 'Moderate breeze (13-18 mph), small branches move'],
+    },
+    # Inclusive survey date bounds; None means "today"
+    'dates': ('2000-01-01', None),
+}
+MAX_SAMPLES = 5
+
+
+def check_observations(raw, typed, schema=QUALITY_SCHEMA):
+    # raw: the frame as read (columns normalized), typed: after parse_observations.
+    # Returns {rule: boolean failure mask}, only for rules that failed at least once.
+    failures = {}
+
+    def add(rule, mask):
+        mask = np.asarray(mask, dtype=bool)
+        if mask.any():
+            failures[rule] = mask
+
+    n = len(typed)
+    for col in schema['required']:
+        add(f"missing:{col}", typed[col].isna().to_numpy() if col in typed.columns else np.ones(n, bool))
+    for col in schema['typed']:
+        if col in raw.columns and col in typed.columns:
+            add(f"unparsed:{col}", raw[col].notna().to_numpy() & typed[col].isna().to_numpy())
+    for col, (low, high) in schema['ranges'].items():
+        if col in typed.columns:
+            values = pd.to_numeric(typed[col], errors='coerce').to_numpy(dtype='float64')
+            with np.errstate(invalid='ignore'):
+                add(f"range:{col}", (values < low) | (values > high))
+    for col, allowed in schema['categories'].items():
+        if col in typed.columns:
+            values = typed[col]
+            add(f"category:{col}", values.notna().to_numpy() & ~values.isin(allowed).to_numpy())
+    if 'date' in typed.columns:
+        low, high = schema['dates']
+        dates = typed['date']
+        high = pd.Timestamp(high) if high else pd.Timestamp.now().normalize()
+        add("date_bounds:date", ((dates < pd.Timestamp(low)) | (dates > high)).to_numpy())
+    return failures
+
+
+def summarize(failures, n):
+    failed = np.zeros(n, dtype=bool)
+    for mask in failures.values():
+        failed |= mask
+    return {'rows': n, 'failed_rows': int(failed.sum()),
+            'rules': {rule: int(mask.sum()) for rule, mask in failures.items()}}
+
+
+def checked_observations(raw, schema=QUALITY_SCHEMA):
+    # clean_observations plus the quality summary of the rows it was given
+    raw = clean_columns(raw)
+    source = raw.copy(deep=False)
+    typed = parse_observations(raw)
+    failures = check_observations(source, typed, schema)
+    return drop_incomplete(typed), summarize(failures, len(typed)), failures, source
+
+
+class QualityReport:
+    """Running rule counts and a few offending source rows per rule for one park."""
+
+    def __init__(self):
+        self.rows = 0
+        self.failed_rows = 0
+        self.rules = {}
+        self.samples = {}
+
+    def add(self, source, summary, failures, offset=0):
+        self.rows += summary['rows']
+        self.failed_rows += summary['failed_rows']
+        for rule, count in summary['rules'].items():
+            self.rules[rule] = self.rules.get(rule, 0) + count
+            taken = self.samples.setdefault(rule, [])
+            if len(taken) < MAX_SAMPLES:
+                rows = np.flatnonzero(failures[rule])[:MAX_SAMPLES - len(taken)]
+                sample = source.iloc[rows].astype(object).where(source.iloc[rows].notna(), None)
+                for position, record in zip(rows, sample.to_dict('records')):
+                    taken.append({'row': int(offset + position), **record})
+
+    def to_dict(self):
+        return {'rows': self.rows, 'failed_rows': self.failed_rows,
+                'rules': dict(sorted(self.rules.items(), key=lambda item: -item[1])),
+                'samples': self.samples}
+
+
+def quality_report(files, chunk_rows=100_000, schema=QUALITY_SCHEMA):
+    # Per-park reports streamed chunk by chunk; files: {(habitat, park): path}
+    reports = {}
+    for (habitat, park), path in files.items():
+        report = QualityReport()
+        offset = 0
+        for chunk in pd.read_csv(path, chunksize=chunk_rows):
+            _, summary, failures, source = checked_observations(chunk, schema)
+            report.add(source, summary, failures, offset)
+            offset += len(chunk)
+        reports[f"{habitat}-{park}"] = report
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate the park data files and report rule failures per park.")
+    parser.add_argument('--parks', help="comma separated park codes (default: all)")
+    parser.add_argument('--samples', action='store_true', help="print sample offending rows for each rule")
+    parser.add_argument('--output', help="write the full report, samples included, as JSON")
+    parser.add_argument('--chunk-rows', type=int, default=100_000)
+    args = parser.parse_args()
+
+    parks = set(args.parks.split(',')) if args.parks else None
+    files = {key: path for key, path in all_data_files().items()
+             if (parks is None or key[1] in parks) and os.path.exists(path)}
+    reports = quality_report(files, args.chunk_rows)
+
+    table = pd.DataFrame([{'park': name, 'rows': report.rows, 'failed_rows': report.failed_rows, **report.rules}
+                          for name, report in reports.items()]).fillna(0)
+    print(table.to_string(index=False))
+    if args.samples:
+        for name, report in reports.items():
+            for rule, rows in report.samples.items():
+                print(f"\n{name} {rule}:")
+                print(pd.DataFrame(rows).to_string(index=False))
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump({name: report.to_dict() for name, report in reports.items()}, fh, indent=1, default=str)
+
+
+if __name__ == "__main__":
+    main()
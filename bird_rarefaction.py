@@ -0,0 +1,133 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from bird_data import all_data_files, shared_observations
+
+# A survey visit: one plot on one date in one visit round
+VISIT_COLUMNS = ['plot_name', 'date', 'visit']
+BOOT_BATCH = 64
+
+
+def visit_incidence(df):
+    # Dense visits x species presence matrix (uint8) for one park's stored frame
+    visit_key = pd.MultiIndex.from_arrays([df[col] for col in VISIT_COLUMNS])
+    visit_codes, visits = pd.factorize(visit_key)
+    species_codes, species = pd.factorize(df['common_name'])
+    keep = (visit_codes >= 0) & (species_codes >= 0)
+    incidence = np.zeros((len(visits), len(species)), dtype=np.uint8)
+    incidence[visit_codes[keep], species_codes[keep]] = 1
+    return incidence, pd.Index(species)
+
+
+def accumulation_curves(incidence, n_draws, rng):
+    # Richness after k = 1..V visits for n_draws random visit orders at once (visits resampled
+    # without replacement; with replacement the curve would be biased low at high effort)
+    n_visits, n_species = incidence.shape
+    draws = rng.permuted(np.tile(np.arange(n_visits), (n_draws, 1)), axis=1)
+    # first[b, v]: position at which visit v is drawn in order b
+    first = np.empty((n_draws, n_visits), dtype=np.int64)
+    np.put_along_axis(first, draws, np.arange(n_visits)[None, :], axis=1)
+    # Each species enters the curve at the earliest draw of any visit that detected it
+    present = incidence.astype(bool)
+    entry = np.where(present[None, :, :], first[:, :, None], n_visits).min(axis=1)
+    # Count entries per draw position, then accumulate along k
+    flat = (np.arange(n_draws)[:, None] * (n_visits + 1) + entry).ravel()
+    counts = np.bincount(flat, minlength=n_draws * (n_visits + 1)).reshape(n_draws, n_visits + 1)
+    return np.cumsum(counts[:, :n_visits], axis=1)
+
+
+def _curve_task(args):
+    # Worker: attach to the shared incidence buffer and run one batch of draws
+    shm_name, offset, shape, n_draws, seed = args
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        incidence = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=offset)
+        return accumulation_curves(incidence, n_draws, np.random.default_rng(seed))
+    finally:
+        shm.close()
+
+
+def _batches(n_boot):
+    return [min(BOOT_BATCH, n_boot - start) for start in range(0, n_boot, BOOT_BATCH)]
+
+
+def species_curves(incidences, n_boot=200, seed=0, workers=None):
+    # incidences: {name: visits x species uint8}. Returns {name: DataFrame of visits, mean, lower,
+    # upper}: the mean and 2.5-97.5% band of n_boot resampled visit orders. Results depend only
+    # on seed, not on the worker count or scheduling.
+    names = list(incidences)
+    sizes = [incidences[name].nbytes for name in names]
+    shm = shared_memory.SharedMemory(create=True, size=max(1, sum(sizes)))
+    try:
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(int)
+        for name, offset in zip(names, offsets):
+            array = incidences[name]
+            np.ndarray(array.shape, dtype=np.uint8, buffer=shm.buf, offset=offset)[...] = array
+
+        tasks, owners = [], []
+        seeds = iter(np.random.SeedSequence(seed).spawn(len(names) * len(_batches(n_boot))))
+        for name, offset in zip(names, offsets):
+            for n_draws in _batches(n_boot):
+                tasks.append((shm.name, offset, incidences[name].shape, n_draws, next(seeds)))
+                owners.append(name)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_curve_task, tasks))
+    finally:
+        shm.close()
+        shm.unlink()
+
+    curves = {}
+    for name in names:
+        draws = np.vstack([result for result, owner in zip(results, owners) if owner == name])
+        curves[name] = pd.DataFrame({
+            'visits': np.arange(1, draws.shape[1] + 1),
+            'mean': draws.mean(axis=0),
+            'lower': np.percentile(draws, 2.5, axis=0),
+            'upper': np.percentile(draws, 97.5, axis=0),
+        })
+    return curves
+
+
+def rarefied_richness(curves, effort=None):
+    # Expected richness of every dataset at a common number of visits (default: the smallest)
+    effort = effort or min(len(curve) for curve in curves.values())
+    rows = []
+    for name, curve in curves.items():
+        at = curve.iloc[min(effort, len(curve)) - 1]
+        rows.append({'dataset': name, 'visits': len(curve), 'observed': curve['mean'].iloc[-1],
+                     'effort': int(at['visits']), 'rarefied': at['mean'], 'lower': at['lower'], 'upper': at['upper']})
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Species-accumulation/rarefaction curves for every park dataset.")
+    parser.add_argument('--boot', type=int, default=200, help="resampled visit orders per dataset")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--effort', type=int, help="visits to rarefy to (default: the smallest dataset)")
+    parser.add_argument('--output', help="write every curve to this CSV")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    incidences = {}
+    for (habitat, park), path in all_data_files().items():
+        if os.path.exists(path):
+            incidences[f"{habitat}-{park}"] = visit_incidence(shared_observations(path)[0])[0]
+    loaded = time.perf_counter()
+    curves = species_curves(incidences, args.boot, args.seed, args.workers)
+    done = time.perf_counter()
+
+    print(rarefied_richness(curves, args.effort).round(2).to_string(index=False))
+    print(f"\n{len(curves)} datasets, {args.boot} draws each: load {loaded - start:.2f}s, curves {done - loaded:.2f}s")
+    if args.output:
+        pd.concat([curve.assign(dataset=name) for name, curve in curves.items()]).to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
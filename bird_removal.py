@@ -0,0 +1,219 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from bird_cooccurrence import visit_keys
+from bird_data import all_data_files, parse_data_file
+from bird_density import maximize_bounded
+from bird_detection import INTERVALS
+from bird_ingest import ingest_park
+from bird_store import ParkStore, park_lock, replace_atomically
+from filter_cache import FilterCache
+from perf_spans import span
+
+# First-detection time bins (minutes) of the 10-minute count. Initial_Three_Min_Cnt splits the
+# 2.5-5 min interval at 3 minutes.
+REMOVAL_EDGES = np.array([0.0, 2.5, 3.0, 5.0, 7.5, 10.0])
+BIN_LABELS = ['0-2.5', '2.5-3', '3-5', '5-7.5', '7.5-10']
+LOG_RATE_BOUNDS = (np.log(1e-3), np.log(50.0))
+# Species with fewer first detections use the park's pooled removal rate
+MIN_VISITS = 15
+STATE_FILE = 'removal.npz'
+
+REMOVAL_CACHE = FilterCache(max_entries=64, max_bytes=32 * 1024 * 1024, ttl=24 * 3600)
+
+
+def detection_bins(interval_codes, three_minute):
+    # Row-level first-detection bin from the interval index and the three-minute flag; -1 when
+    # the interval is unknown or the 2.5-5 min row has no flag
+    interval = np.asarray(interval_codes, dtype=np.int64)
+    flag = np.asarray(three_minute, dtype='float64')
+    bins = np.where(interval >= 2, interval + 1, interval)
+    second = interval == 1
+    bins[second] = np.where(flag[second] == 1, 1, np.where(flag[second] == 0, 2, -1))
+    bins[interval < 0] = -1
+    return bins
+
+
+class RemovalState:
+    """Earliest detection bin of every species at every survey visit of one park store."""
+
+    def __init__(self):
+        self.rows = 0
+        self.batches = 0
+        self.signature = ''
+        self.species = np.zeros(0, dtype=np.int32)
+        self.visits = np.zeros(0, dtype=np.int64)
+        self.first = np.zeros(0, dtype=np.int8)
+
+    def update(self, store):
+        # Group-first over (species, visit) for the appended rows, merged with the kept minima:
+        # a visit split across batches can only move a species' first detection earlier
+        start, end = self.rows, store.rows
+        interval_codes = pd.Index(INTERVALS).get_indexer(store.dictionary('interval_length'))
+        stored = store.column('interval_length')[start:end]
+        intervals = np.where(stored >= 0, interval_codes[np.maximum(stored, 0)], -1)
+        bins = detection_bins(intervals, store.column('initial_three_min_cnt')[start:end])
+        species = np.asarray(store.column('common_name')[start:end], dtype=np.int32)
+        visits = visit_keys(store.column('plot_name')[start:end], store.column('day_number')[start:end],
+                            store.column('visit')[start:end])
+        keep = (bins >= 0) & (species >= 0) & (visits >= 0)
+
+        merged = pd.DataFrame({
+            'species': np.concatenate([self.species, species[keep]]),
+            'visit': np.concatenate([self.visits, visits[keep]]),
+            'first': np.concatenate([self.first, bins[keep].astype(np.int8)]),
+        }).groupby(['species', 'visit'], sort=True)['first'].min()
+        self.species = merged.index.get_level_values('species').to_numpy(dtype=np.int32)
+        self.visits = merged.index.get_level_values('visit').to_numpy(dtype=np.int64)
+        self.first = merged.to_numpy(dtype=np.int8)
+        self.rows = end
+        self.batches = len(store.manifest['batches']) if store.manifest else 0
+        self.signature = store.batches_signature(self.batches)
+
+    def histograms(self, n_species, by_plot=False):
+        # species x bins counts of first detections, or (species, plot code) -> bins when by_plot
+        n_bins = len(BIN_LABELS)
+        if not by_plot:
+            flat = self.species.astype(np.int64) * n_bins + self.first
+            return np.bincount(flat, minlength=n_species * n_bins).reshape(n_species, n_bins)
+        plots = self.visits >> 40
+        return pd.crosstab([self.species, plots], self.first).reindex(columns=range(n_bins), fill_value=0)
+
+    def save(self, path):
+        def write(tmp):
+            np.savez(tmp, rows=self.rows, batches=self.batches, signature=self.signature,
+                     species=self.species, visits=self.visits, first=self.first)
+        replace_atomically(path, write, suffix='.npz')
+
+    @classmethod
+    def load(cls, path):
+        state = cls()
+        with np.load(path) as data:
+            state.rows = int(data['rows'])
+            state.batches = int(data['batches'])
+            state.signature = str(data['signature'])
+            state.species, state.visits, state.first = data['species'], data['visits'], data['first']
+        return state
+
+
+def fit_removal(histograms, edges=REMOVAL_EDGES):
+    # Constant-rate removal model for every row of first-detection counts at once: a bird present
+    # is first detected in [a, b) with probability exp(-phi a) - exp(-phi b), conditioned on
+    # being detected by the end of the count. Returns (log phi, detection probability).
+    counts, inverse = np.unique(np.asarray(histograms, dtype='float64'), axis=0, return_inverse=True)
+    low, high = edges[:-1], edges[1:]
+
+    def loglik(log_rate):
+        rate = np.exp(log_rate)[:, None]
+        mass = np.exp(-rate * low) - np.exp(-rate * high)
+        p = mass / -np.expm1(-rate * edges[-1])
+        return (counts * np.log(np.maximum(p, 1e-300))).sum(axis=1)
+
+    log_rate = maximize_bounded(loglik, len(counts), LOG_RATE_BOUNDS)[inverse.ravel()]
+    return log_rate, -np.expm1(-np.exp(log_rate) * edges[-1])
+
+
+def removal_table(histograms, species):
+    # Per-species detectability; sparse species borrow the pooled rate of all species
+    n = histograms.sum(axis=1)
+    log_rate, p = fit_removal(histograms)
+    pooled_rate, pooled_p = fit_removal(histograms.sum(axis=0, keepdims=True))
+    pooled = n < MIN_VISITS
+    table = pd.DataFrame(histograms, columns=BIN_LABELS)
+    table.insert(0, 'species', species)
+    table.insert(1, 'visits_detected', n)
+    table['rate_per_min'] = np.exp(np.where(pooled, pooled_rate[0], log_rate))
+    table['p_detect'] = np.where(pooled, pooled_p[0], p)
+    table['pooled'] = pooled
+    return table[n > 0].reset_index(drop=True)
+
+
+def park_removal(path, root=None):
+    # Incrementally maintained first-detection state, persisted next to the park's store. Load,
+    # update and save run under the park's 'removal' lock (taken before ingest_park's).
+    habitat, park = parse_data_file(path)
+    with park_lock(habitat, park, root, name='removal'):
+        ingest_park(path, root)
+        store = ParkStore(habitat, park, root)
+        state_path = os.path.join(store.path, STATE_FILE)
+        state = RemovalState.load(state_path) if os.path.exists(state_path) else None
+        if state is None or state.rows > store.rows or state.signature != store.batches_signature(state.batches):
+            state = RemovalState()
+        if state.rows < store.rows:
+            with span('removal_update', rows_in=store.rows - state.rows) as stage:
+                state.update(store)
+                stage.rows_out = len(state.first)
+            state.save(state_path)
+        return state, store
+
+
+def detectability(path, root=None):
+    # Per-species removal-model detectability for one park, cached per store state
+    state, store = park_removal(path, root)
+
+    def compute():
+        species = pd.Index(store.dictionary('common_name') if store.rows else [], dtype=object)
+        with span('removal_fit', rows_in=len(state.first)) as stage:
+            table = removal_table(state.histograms(len(species)), species)
+            stage.rows_out = len(table)
+        return table
+
+    return REMOVAL_CACHE.get_or_compute(path, f"{state.rows}:{state.signature}", {}, compute)
+
+
+def corrected_abundance(df, table):
+    # Raw detections per species next to the count corrected for availability (raw / p)
+    raw = df.groupby('common_name', observed=True).size().rename('raw_count')
+    merged = table.set_index('species')[['p_detect', 'pooled']].join(raw, how='inner')
+    merged['corrected'] = merged['raw_count'] / merged['p_detect']
+    return merged.reset_index(names='species').sort_values('raw_count', ascending=False)
+
+
+def render_detectability_panel(container, dataset, df, species=None):
+    # Raw vs availability-corrected counts for the park; the selected species is called out
+    table = corrected_abundance(df, detectability(dataset))
+    if species is not None and species in set(table['species']):
+        row = table[table['species'] == species].iloc[0]
+        container.caption(f"{species}: detected within 10 minutes with p = {row['p_detect']:.2f}"
+                          f"{' (pooled)' if row['pooled'] else ''}; {int(row['raw_count'])} records "
+                          f"correspond to about {row['corrected']:.0f} birds available")
+    container.dataframe(table.round({'p_detect': 3, 'corrected': 1}), hide_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Removal-model detectability from first-detection intervals.")
+    parser.add_argument('--parks', help="comma separated park codes (default: all)")
+    parser.add_argument('--by-plot', action='store_true', help="print first-detection histograms per species/plot")
+    parser.add_argument('--output', help="write every park's table to this CSV")
+    args = parser.parse_args()
+
+    parks = set(args.parks.split(',')) if args.parks else None
+    tables = []
+    for (habitat, park), path in sorted(all_data_files().items()):
+        if parks is not None and park not in parks or not (os.path.exists(path) or ParkStore(habitat, park).rows):
+            continue
+        start = time.perf_counter()
+        table = detectability(path)
+        elapsed = time.perf_counter() - start
+        print(f"\n{habitat}-{park} ({elapsed:.2f}s)")
+        print(table.sort_values('visits_detected', ascending=False).head(8).round(3).to_string(index=False))
+        if args.by_plot:
+            state, store = park_removal(path)
+            by_plot = state.histograms(len(store.dictionary('common_name')), by_plot=True)
+            by_plot.index = pd.MultiIndex.from_arrays([
+                np.asarray(store.dictionary('common_name'), dtype=object)[by_plot.index.get_level_values(0)],
+                np.asarray(store.dictionary('plot_name'), dtype=object)[by_plot.index.get_level_values(1)]],
+                names=['species', 'plot'])
+            by_plot.columns = BIN_LABELS
+            print(by_plot.head(10).to_string())
+        tables.append(table.assign(park=f"{habitat}-{park}"))
+    if args.output and tables:
+        pd.concat(tables, ignore_index=True).to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.cluster.hierarchy import leaves_list, linkage
+from scipy.spatial.distance import squareform
+
+from bird_diversity import DIVERSITY_CACHE, LEVELS, cached_abundance, group_matrix
+from perf_spans import span
+
+METRICS = ['jaccard', 'sorensen', 'bray_curtis']
+
+
+def _shared_presence(matrix):
+    # Species two groups have in common, for every pair: B B' over the 0/1 pattern
+    binary = sp.csr_matrix((np.ones(matrix.nnz), matrix.indices, matrix.indptr), shape=matrix.shape)
+    return (binary @ binary.T).toarray(), np.diff(matrix.indptr).astype('float64')
+
+
+def _shared_abundance(matrix):
+    # sum_k min(x_ik, x_jk) for every pair. min() is not bilinear, so instead of a product this
+    # adds one outer minimum per species over just the groups that recorded it: the work is
+    # sum_k n_k^2 over non-zeros rather than groups^2 x species.
+    n = matrix.shape[0]
+    columns = matrix.tocsc()
+    columns.sort_indices()
+    shared = np.zeros((n, n))
+    for k in range(columns.shape[1]):
+        start, stop = columns.indptr[k], columns.indptr[k + 1]
+        if start == stop:
+            continue
+        groups = columns.indices[start:stop]
+        values = columns.data[start:stop]
+        shared[np.ix_(groups, groups)] += np.minimum.outer(values, values)
+    return shared
+
+
+def similarity_matrix(matrix, metric='jaccard'):
+    # Dense group x group similarity from a group x species CSR matrix:
+    # Jaccard |A and B| / |A or B|, Sørensen 2|A and B| / (|A| + |B|) on presence,
+    # Bray-Curtis 1 - BC = 2 sum min(x, y) / (sum x + sum y) on abundance
+    matrix = matrix.tocsr()
+    matrix.eliminate_zeros()
+    if metric == 'bray_curtis':
+        shared = _shared_abundance(matrix)
+        totals = np.asarray(matrix.sum(axis=1)).ravel()
+        denominator = totals[:, None] + totals[None, :]
+        shared = 2 * shared
+    else:
+        shared, sizes = _shared_presence(matrix)
+        denominator = sizes[:, None] + sizes[None, :]
+        if metric == 'jaccard':
+            denominator = denominator - shared
+        else:
+            shared = 2 * shared
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, shared / denominator, np.nan)
+
+
+def cluster_order(similarity):
+    # Leaf order of an average-linkage tree on 1 - similarity, so similar groups sit together
+    if len(similarity) < 3:
+        return np.arange(len(similarity))
+    distance = 1 - np.nan_to_num(similarity, nan=0.0)
+    np.fill_diagonal(distance, 0)
+    return leaves_list(linkage(squareform(np.clip(distance, 0, None), checks=False), method='average'))
+
+
+def _group_names(labels):
+    # "FOREST-PRWI", "FOREST-PRWI/PRWI-0123", ... from the level's key columns
+    parts = labels.astype(object).where(labels.notna(), '?')
+    names = parts.iloc[:, 0].astype(str)
+    if 'park' in parts.columns:
+        names = names + '-' + parts['park'].astype(str)
+    for col in parts.columns.drop(['habitat', 'park'], errors='ignore'):
+        names = names + '/' + parts[col].astype(str)
+    return pd.Index(names, name=None)
+
+
+def similarity_table(abundance, level='park', metric='jaccard', order=True):
+    labels, matrix = group_matrix(abundance, LEVELS[level])
+    values = similarity_matrix(matrix, metric)
+    names = _group_names(labels)
+    if order:
+        index = cluster_order(values)
+        values, names = values[np.ix_(index, index)], names[index]
+    return pd.DataFrame(values, index=names, columns=names)
+
+
+def similarity(level='park', metric='jaccard', order=True, files=None):
+    # Labeled similarity matrix between every park's groups at a level, cached per dataset version
+    abundance, version = cached_abundance(files)
+
+    def compute():
+        with span('similarity_' + metric, rows_in=abundance.matrix.shape[0]) as stage:
+            table = similarity_table(abundance, level, metric, order)
+            stage.rows_out = len(table)
+        return table
+
+    return DIVERSITY_CACHE.get_or_compute('similarity', version,
+                                          {'level': level, 'metric': metric, 'order': order}, compute)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Community similarity between parks, sites or plots.")
+    parser.add_argument('--level', choices=list(LEVELS), default='park')
+    parser.add_argument('--metric', choices=METRICS, default='jaccard')
+    parser.add_argument('--no-order', action='store_true', help="keep label order instead of clustering")
+    parser.add_argument('--output', help="write the matrix to this CSV")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    table = similarity(args.level, args.metric, not args.no_order)
+    elapsed = time.perf_counter() - start
+    with pd.option_context('display.width', 200, 'display.max_columns', 20):
+        print(table.round(2))
+    print(f"\n{len(table)} groups in {elapsed:.2f}s")
+    if args.output:
+        table.to_csv(args.output)
+
+
+if __name__ == "__main__":
+    main()
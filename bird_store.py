@@ -0,0 +1,331 @@
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from bird_data import DATE_DIMENSION
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Cleaned observations cached per park as append-only raw column buffers:
+#   .bird_store/<HABITAT>-<PARK>/manifest.json   row count, dtypes, ingest watermark, batch index
+#   .bird_store/<HABITAT>-<PARK>/<column>.bin    fixed-width values (dictionary codes for text)
+#   .bird_store/<HABITAT>-<PARK>/<column>.json   dictionary for text columns
+#   .bird_store/<HABITAT>-<PARK>/aggregates.npz  running totals by species and by day
+#   .bird_store/<HABITAT>-<PARK>/row_hashes.bin  uint64 dedupe hash per stored row
+#   .bird_store/<HABITAT>-<PARK>.<name>.lock      writer lock files (outside the directory, which resets)
+STORE_ROOT = os.environ.get('BIRD_STORE', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.bird_store'))
+
+NUMERIC_COLUMNS = ['year', 'visit', 'acceptedtsn', 'npstaxoncode', 'taxoncode',
+                   'initial_three_min_cnt', 'temperature', 'humidity', 'is_duplicate']
+# Times of day are stored as int32 seconds since midnight (-1 when missing) and read back as
+# datetime.time values
+TIME_COLUMNS = ['start_time', 'end_time']
+CODE_DTYPE = np.dtype('int32')
+SECONDS_DTYPE = np.dtype('int32')
+HASH_DTYPE = np.dtype('uint64')
+# Bumped when the on-disk layout changes; older stores read as empty and are re-ingested
+STORE_VERSION = 3
+
+
+def store_dir(habitat, park, root=None):
+    return os.path.join(root or STORE_ROOT, f"{habitat}-{park}")
+
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+@contextmanager
+def park_lock(habitat, park, root=None, name='ingest'):
+    # Serializes writers of one park: a threading.Lock for sessions in this process plus an
+    # flock on a lock file for other processes (pipeline, CLIs). Each name is a separate lock;
+    # take them in a fixed order (derived state before 'ingest'), never the same name twice.
+    path = f"{store_dir(habitat, park, root)}.{name}.lock"
+    with _thread_locks_guard:
+        lock = _thread_locks.setdefault(path, threading.Lock())
+    with lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a') as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def replace_atomically(path, write, suffix=''):
+    # write(tmp_path) into a temp file unique to this writer, then swap it in; concurrent
+    # writers never move each other's temp files
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=os.path.basename(path) + '.',
+                               suffix='.tmp' + suffix)
+    os.close(fd)
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _time_seconds(values):
+    # datetime.time values (or anything to_datetime parses) -> seconds since midnight, -1 if missing
+    # Each distinct value is parsed once
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    clock = [v.isoformat() if isinstance(v, datetime.time) else v for v in uniques]
+    stamps = pd.to_datetime(pd.Series(clock, dtype=object), format='mixed', errors='coerce')
+    seconds = (stamps - stamps.dt.normalize()).dt.total_seconds().fillna(-1).to_numpy(dtype=SECONDS_DTYPE)
+    return np.append(seconds, SECONDS_DTYPE.type(-1))[codes]
+
+
+def _time_values(seconds):
+    # Inverse of _time_seconds, converting each distinct value once
+    uniques, inverse = np.unique(seconds, return_inverse=True)
+    clock = np.array([datetime.time(s // 3600, s // 60 % 60, s % 60) if s >= 0 else None
+                      for s in uniques.tolist()] + [None], dtype=object)
+    return clock[inverse.ravel()] if len(uniques) else np.zeros(0, dtype=object)
+
+
+def _column_file(name):
+    return name.replace(os.sep, '_')
+
+
+def _dtype(kind):
+    if kind == 'dict':
+        return CODE_DTYPE
+    return SECONDS_DTYPE if kind == 'time' else np.dtype(kind)
+
+
+def _empty_values(kind, n):
+    if kind in ('dict', 'time'):
+        return np.full(n, -1, dtype=_dtype(kind))
+    if kind == 'datetime64[ns]':
+        return np.full(n, np.datetime64('NaT'), dtype='datetime64[ns]')
+    if np.dtype(kind).kind == 'i':
+        return np.full(n, -1, dtype=kind)
+    return np.full(n, np.nan)
+
+
+class ParkStore:
+    def __init__(self, habitat, park, root=None):
+        self.habitat = habitat
+        self.park = park
+        self.path = store_dir(habitat, park, root)
+        self.manifest = self._read_manifest()
+        self._dictionaries = {}
+
+    def _read_manifest(self):
+        try:
+            with open(os.path.join(self.path, 'manifest.json')) as fh:
+                manifest = json.load(fh)
+        except FileNotFoundError:
+            return None
+        return manifest if manifest.get('store_version') == STORE_VERSION else None
+
+    def _write_json(self, name, payload):
+        def write(tmp):
+            with open(tmp, 'w') as fh:
+                json.dump(payload, fh)
+
+        replace_atomically(os.path.join(self.path, name), write)
+
+    def mark_checked(self, version):
+        # Records that the source at `version` was read to the end with nothing to append. Kept
+        # outside the batches so their signature (which derived state keys on) does not change.
+        if self.manifest:
+            self.manifest['checked_version'] = version
+            self._write_json('manifest.json', self.manifest)
+
+    @property
+    def rows(self):
+        return self.manifest['rows'] if self.manifest else 0
+
+    def batches_signature(self, n=None):
+        # Identifies the first n batches (default: all); state derived from a store that was
+        # rebuilt or rewritten since no longer matches
+        batches = self.manifest['batches'][:n] if self.manifest else []
+        return hashlib.sha1(json.dumps(batches, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+    def reset(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+        self.manifest = None
+        self._dictionaries = {}
+
+    def dictionary(self, col):
+        if col not in self._dictionaries:
+            with open(os.path.join(self.path, _column_file(col) + '.json')) as fh:
+                self._dictionaries[col] = json.load(fh)
+        return self._dictionaries[col]
+
+    def _encode(self, col, values):
+        # Extend the column dictionary with unseen values; existing codes never change
+        categories = self.dictionary(col) if self.manifest and col in self.manifest['columns'] else []
+        lookup = {value: code for code, value in enumerate(categories)}
+        present = values.notna().to_numpy()
+        text = values.astype(str).to_numpy()
+        uniques, inverse = np.unique(text[present], return_inverse=True)
+        for value in uniques:
+            if value not in lookup:
+                lookup[value] = len(categories)
+                categories.append(value)
+        codes = np.full(len(values), -1, dtype=CODE_DTYPE)
+        codes[present] = np.array([lookup[v] for v in uniques], dtype=CODE_DTYPE)[inverse]
+        self._dictionaries[col] = categories
+        return codes
+
+    def _truncate(self, manifest):
+        # Drop bytes left behind by an append that never reached the manifest
+        for col, kind in manifest['columns'].items():
+            path = os.path.join(self.path, _column_file(col) + '.bin')
+            expected = manifest['rows'] * _dtype(kind).itemsize
+            if os.path.getsize(path) != expected:
+                os.truncate(path, expected)
+        hashes = os.path.join(self.path, 'row_hashes.bin')
+        if os.path.exists(hashes) and os.path.getsize(hashes) > manifest['rows'] * HASH_DTYPE.itemsize:
+            os.truncate(hashes, manifest['rows'] * HASH_DTYPE.itemsize)
+
+    @staticmethod
+    def _column_kind(col):
+        if col == 'date':
+            return 'datetime64[ns]'
+        if col in DATE_DIMENSION:
+            return DATE_DIMENSION[col]
+        if col in TIME_COLUMNS:
+            return 'time'
+        return 'float64' if col in NUMERIC_COLUMNS else 'dict'
+
+    def append(self, df, batch, hashes=None):
+        # Append cleaned rows; batch carries the ingest watermark and per-batch metadata,
+        # hashes the rows' dedupe hashes
+        os.makedirs(self.path, exist_ok=True)
+        manifest = self.manifest or {'store_version': STORE_VERSION, 'habitat': self.habitat, 'park': self.park,
+                                     'rows': 0, 'columns': {}, 'batches': []}
+        columns = manifest['columns']
+        self._truncate(manifest)
+        for col in df.columns:
+            if col not in columns:
+                # Columns first seen in a later batch are back-filled for earlier rows
+                kind = columns[col] = self._column_kind(col)
+                _empty_values(kind, manifest['rows']).tofile(os.path.join(self.path, _column_file(col) + '.bin'))
+
+        encoded = {}
+        for col, kind in columns.items():
+            if col not in df.columns:
+                values = pd.Series([None] * len(df), index=df.index, dtype=object)
+            else:
+                values = df[col]
+            if kind == 'dict':
+                data = encoded[col] = self._encode(col, values)
+                self._write_json(_column_file(col) + '.json', self._dictionaries[col])
+            elif kind == 'datetime64[ns]':
+                data = pd.to_datetime(values).to_numpy(dtype='datetime64[ns]')
+            elif col in DATE_DIMENSION:
+                data = values.to_numpy(dtype=kind)
+            elif kind == 'time':
+                data = _time_seconds(values)
+            else:
+                data = pd.to_numeric(values, errors='coerce').to_numpy(dtype='float64')
+            with open(os.path.join(self.path, _column_file(col) + '.bin'), 'ab') as fh:
+                data.tofile(fh)
+
+        self._append_hashes(manifest['rows'], hashes)
+        row_start = manifest['rows']
+        manifest['rows'] += len(df)
+        dates = df['date'] if 'date' in df.columns else pd.Series(dtype='datetime64[ns]')
+        manifest['batches'].append({
+            'row_start': row_start,
+            'row_end': manifest['rows'],
+            'date_min': str(dates.min().date()) if len(dates) else None,
+            'date_max': str(dates.max().date()) if len(dates) else None,
+            **batch,
+        })
+        self._update_aggregates(df, encoded['common_name'])
+        self._write_json('manifest.json', manifest)
+        self.manifest = manifest
+
+    def _append_hashes(self, rows, hashes):
+        # Kept only while it covers every stored row; a gap would make later dedupe miss rows
+        path = os.path.join(self.path, 'row_hashes.bin')
+        covered = os.path.getsize(path) // HASH_DTYPE.itemsize if os.path.exists(path) else 0
+        if hashes is None or covered != rows:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        with open(path, 'ab') as fh:
+            np.asarray(hashes, dtype=HASH_DTYPE).tofile(fh)
+
+    def row_hashes(self):
+        # Dedupe hashes of every stored row, or None when they are not all known
+        path = os.path.join(self.path, 'row_hashes.bin')
+        if not self.rows:
+            return np.zeros(0, dtype=HASH_DTYPE)
+        if not os.path.exists(path) or os.path.getsize(path) < self.rows * HASH_DTYPE.itemsize:
+            return None
+        return np.fromfile(path, dtype=HASH_DTYPE, count=self.rows)
+
+    def _update_aggregates(self, df, species_codes):
+        # Running totals only need the delta rows added to the previous totals
+        counts = df['initial_three_min_cnt'].to_numpy(dtype='float64')
+        n_species = len(self.dictionary('common_name'))
+        old = self.aggregates()
+        species_totals = np.zeros(n_species)
+        species_records = np.zeros(n_species, dtype='int64')
+        species_totals[:len(old['species_totals'])] = old['species_totals']
+        species_records[:len(old['species_records'])] = old['species_records']
+        valid = species_codes >= 0
+        np.add.at(species_totals, species_codes[valid], counts[valid])
+        np.add.at(species_records, species_codes[valid], 1)
+
+        days = df['date'].to_numpy(dtype='datetime64[D]')
+        daily = pd.Series(np.concatenate([old['daily_totals'], counts]),
+                          index=np.concatenate([old['days'], days])).groupby(level=0).sum()
+        np.savez(os.path.join(self.path, 'aggregates.npz'),
+                 species_totals=species_totals, species_records=species_records,
+                 days=daily.index.to_numpy(dtype='datetime64[D]'), daily_totals=daily.to_numpy())
+
+    def aggregates(self):
+        try:
+            with np.load(os.path.join(self.path, 'aggregates.npz')) as data:
+                return {key: data[key] for key in data.files}
+        except FileNotFoundError:
+            return {'species_totals': np.zeros(0), 'species_records': np.zeros(0, dtype='int64'),
+                    'days': np.zeros(0, dtype='datetime64[D]'), 'daily_totals': np.zeros(0)}
+
+    def column(self, col, mmap=True):
+        dtype = _dtype(self.manifest['columns'][col])
+        path = os.path.join(self.path, _column_file(col) + '.bin')
+        if not self.rows:
+            return np.zeros(0, dtype=dtype)
+        if mmap:
+            return np.memmap(path, dtype=dtype, mode='r', shape=(self.rows,))
+        return np.fromfile(path, dtype=dtype, count=self.rows)
+
+    def read_frame(self, columns=None, start=0, stop=None):
+        # Rows [start, stop) of the store; a sub-range reads only that slice of each column
+        data = {}
+        whole = start == 0 and stop is None
+        for col in columns or self.manifest['columns']:
+            values = self.column(col, mmap=False) if whole else np.array(self.column(col)[start:stop])
+            if self.manifest['columns'][col] == 'dict':
+                categories = self.dictionary(col)
+                cat = pd.Categorical.from_codes(values, categories=pd.Index(categories, dtype=object))
+                data[col] = cat.reorder_categories(sorted(categories))
+            elif self.manifest['columns'][col] == 'time':
+                data[col] = _time_values(values)
+            else:
+                data[col] = values
+        return pd.DataFrame(data)
@@ -0,0 +1,162 @@
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+from bird_data import all_data_files
+from bird_diversity import dataset_frames
+from filter_cache import FilterCache
+from perf_spans import span
+
+# Poisson IRLS settings and the series worth fitting
+MAX_ITER = 30
+TOLERANCE = 1e-8
+MIN_YEARS = 3
+MIN_DETECTION_YEARS = 2
+ETA_LIMIT = 30.0
+
+TREND_CACHE = FilterCache(max_entries=16, max_bytes=64 * 1024 * 1024, ttl=24 * 3600)
+
+
+def survey_tensor(frames):
+    # frames: {(habitat, park): stored frame}. Returns detections (parks x species x years),
+    # effort (parks x years, distinct plot visits), species labels, years and park names
+    species = pd.Index(sorted(set().union(*[df['common_name'].cat.categories for df in frames.values()])))
+    year_values = np.concatenate([df['year'].to_numpy() for df in frames.values()]) if frames else np.zeros(0)
+    low = int(year_values.min()) if len(year_values) else 0
+    years = pd.RangeIndex(low, int(year_values.max()) + 1 if len(year_values) else 0)
+    n_species, n_years = len(species), len(years)
+    counts = np.zeros((len(frames), n_species, n_years))
+    effort = np.zeros((len(frames), n_years))
+    for p, df in enumerate(frames.values()):
+        codes = species.get_indexer(df['common_name'].cat.categories)[df['common_name'].cat.codes.to_numpy()]
+        codes[df['common_name'].cat.codes.to_numpy() < 0] = -1
+        year = df['year'].to_numpy(dtype='int64') - low
+        keep = codes >= 0
+        counts[p] = np.bincount(codes[keep] * n_years + year[keep],
+                                minlength=n_species * n_years).reshape(n_species, n_years)
+        visits = df.drop_duplicates(['plot_name', 'date', 'visit'])['year'].to_numpy(dtype='int64') - low
+        effort[p] = np.bincount(visits, minlength=n_years)
+    names = [f"{habitat}-{park}" for habitat, park in frames]
+    return counts, effort, species, years, names
+
+
+def fit_poisson_trends(counts, effort, years):
+    # Fits log E[y_it] = a_i + b_i (t - t0) + log(effort_t) for every row i of counts (series x years)
+    # at once: each IRLS step is a 2x2 weighted least-squares solve written out in closed form over
+    # the stacked series. Years without effort are left out. Standard errors are scaled by the
+    # Pearson dispersion when the counts are overdispersed (quasi-Poisson).
+    counts = np.asarray(counts, dtype='float64')
+    effort = np.broadcast_to(np.asarray(effort, dtype='float64'), counts.shape)
+    observed = effort > 0
+    offset = np.log(np.where(observed, effort, 1.0))
+    t = np.asarray(years, dtype='float64')
+    t = np.broadcast_to(t - t.mean(), counts.shape)
+    n_years = observed.sum(axis=1)
+
+    # Start from the flat fit: the overall rate per unit effort
+    rate = counts.sum(axis=1) / np.maximum(effort.sum(axis=1, where=observed), 1)
+    intercept = np.log(np.maximum(rate, 1e-10))
+    slope = np.zeros(len(counts))
+    converged = np.zeros(len(counts), dtype=bool)
+    for _ in range(MAX_ITER):
+        eta = np.clip(intercept[:, None] + slope[:, None] * t + offset, -ETA_LIMIT, ETA_LIMIT)
+        mu = np.exp(eta)
+        weight = np.where(observed, mu, 0.0)
+        z = eta - offset + (counts - mu) / mu
+        s0, s1, s2 = weight.sum(axis=1), (weight * t).sum(axis=1), (weight * t * t).sum(axis=1)
+        r0, r1 = (weight * z).sum(axis=1), (weight * t * z).sum(axis=1)
+        det = s0 * s2 - s1 * s1
+        with np.errstate(divide='ignore', invalid='ignore'):
+            new_intercept = np.where(det > 0, (s2 * r0 - s1 * r1) / det, intercept)
+            new_slope = np.where(det > 0, (s0 * r1 - s1 * r0) / det, slope)
+        converged = np.abs(new_slope - slope) < TOLERANCE * (1 + np.abs(slope))
+        intercept, slope = new_intercept, new_slope
+        if converged.all():
+            break
+
+    mu = np.exp(np.clip(intercept[:, None] + slope[:, None] * t + offset, -ETA_LIMIT, ETA_LIMIT))
+    weight = np.where(observed, mu, 0.0)
+    s0, s1, s2 = weight.sum(axis=1), (weight * t).sum(axis=1), (weight * t * t).sum(axis=1)
+    pearson = np.where(observed, (counts - mu) ** 2 / mu, 0.0).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dispersion = np.maximum(1.0, np.where(n_years > 2, pearson / (n_years - 2), 1.0))
+        se = np.sqrt(s0 / (s0 * s2 - s1 * s1) * dispersion)
+    return {'slope': slope, 'se': se, 'dispersion': dispersion, 'n_years': n_years, 'converged': converged}
+
+
+def _fit_park(args):
+    counts, effort, years = args
+    return fit_poisson_trends(counts, effort, years)
+
+
+def fit_parks(counts, effort, years, workers=None):
+    # counts: parks x series x years, effort: parks x years; one task per park
+    tasks = [(counts[p], effort[p], years) for p in range(len(counts))]
+    if workers == 1 or len(tasks) < 2:
+        return [_fit_park(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_fit_park, tasks))
+
+
+def trend_table(counts, effort, species, years, parks, workers=None, min_years=MIN_YEARS):
+    # One row per species x park with enough data: annual slope on the log scale, its 95% CI,
+    # the same as % change per year, and a two-sided Wald p-value
+    fits = fit_parks(counts, effort, np.asarray(years), workers)
+    detected_years = ((counts > 0) & (effort[:, None, :] > 0)).sum(axis=2)
+    parts = []
+    for p, fit in enumerate(fits):
+        part = pd.DataFrame({'park': parks[p], 'species': species, 'detections': counts[p].sum(axis=1),
+                             'detected_years': detected_years[p], **fit})
+        parts.append(part[(part['n_years'] >= min_years) & (part['detected_years'] >= MIN_DETECTION_YEARS)])
+    table = pd.concat(parts, ignore_index=True)
+    z = norm.ppf(0.975)
+    table['lower'] = table['slope'] - z * table['se']
+    table['upper'] = table['slope'] + z * table['se']
+    table['pct_change'] = np.expm1(table['slope']) * 100
+    table['p_value'] = 2 * norm.sf(np.abs(table['slope'] / table['se']))
+    table['significant'] = table['p_value'] < 0.05
+    return table
+
+
+def trends(files=None, workers=None, min_years=MIN_YEARS):
+    # Trend table for every species x park, cached per combined dataset version
+    frames, version = dataset_frames(files or all_data_files())
+
+    def compute():
+        with span('trend_fit', rows_in=sum(len(df) for df in frames.values())) as stage:
+            table = trend_table(*survey_tensor(frames), workers=workers, min_years=min_years)
+            stage.rows_out = len(table)
+        return table
+
+    return TREND_CACHE.get_or_compute('trends', version, {'min_years': min_years}, compute)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Poisson year trends for every species in every park.")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--min-years', type=int, default=MIN_YEARS)
+    parser.add_argument('--significant', action='store_true', help="only list trends with p < 0.05")
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--output', help="write the full trend table to this CSV")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    table = trends(workers=args.workers, min_years=args.min_years)
+    elapsed = time.perf_counter() - start
+    if not len(table):
+        print(f"No species x park series with {args.min_years}+ surveyed years ({elapsed:.2f}s)")
+        return
+    shown = table[table['significant']] if args.significant else table
+    columns = ['park', 'species', 'detections', 'n_years', 'slope', 'lower', 'upper', 'pct_change', 'p_value']
+    print(shown.sort_values('p_value')[columns].head(args.top).round(4).to_string(index=False))
+    print(f"\n{len(table)} series, {int(table['significant'].sum())} significant, {elapsed:.2f}s")
+    if args.output:
+        table.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import argparse
+import datetime
+import hashlib
+import os
+import time
+from contextlib import ExitStack
+
+import pandas as pd
+
+from bird_data import HABITAT_PARKS, add_date_dimension, clean_columns, dataset_version, workbook_file
+from bird_dedupe import store_deduper
+from bird_quality import checked_observations
+from bird_store import ParkStore, park_lock
+from perf_spans import span
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+XLSX_CHUNK_ROWS = 50_000
+# Excel serial day 0 (the 1900 leap-year bug makes this 1899-12-30, not 12-31)
+EXCEL_EPOCH = pd.Timestamp('1899-12-30')
+DATE_COLUMNS = ['date']
+TIME_COLUMNS = ['start_time', 'end_time']
+
+
+def excel_datetimes(values):
+    # Cells arrive as raw serial day numbers or, when openpyxl applies the number format,
+    # as datetime/time objects; only stray text cells fall back to string parsing
+    series = pd.Series(values, dtype=object)
+    kinds = series.map(type)
+    serial = pd.to_numeric(series.where(kinds.isin((int, float))), errors='coerce')
+    out = EXCEL_EPOCH + pd.to_timedelta((serial * 86_400_000).round(), unit='ms')
+    clock = (kinds == datetime.time).to_numpy()
+    if clock.any():
+        out[clock] = EXCEL_EPOCH + pd.to_timedelta(series[clock].map(datetime.time.isoformat))
+    rest = (out.isna() & series.notna()).to_numpy() & ~clock
+    if rest.any():
+        out[rest] = pd.to_datetime(series[rest], errors='coerce')
+    return out
+
+
+def excel_times(values):
+    # Time-of-day only: a serial's fraction, or the clock part of a time/datetime cell
+    stamps = excel_datetimes(values)
+    return EXCEL_EPOCH + (stamps - stamps.dt.normalize())
+
+
+def _typed_frame(header, rows):
+    df = clean_columns(pd.DataFrame.from_records(rows, columns=header))
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            df[col] = excel_datetimes(df[col])
+    for col in TIME_COLUMNS:
+        if col in df.columns:
+            df[col] = excel_times(df[col])
+    return df
+
+
+def _sheet_rows(sheet):
+    # Header plus data rows, skipping the blank trailing rows Excel often keeps
+    rows = sheet.iter_rows(values_only=True)
+    header = [str(name).strip() for name in next(rows, ()) if name is not None]
+    width = len(header)
+    return header, (row[:width] for row in rows if any(value is not None for value in row[:width]))
+
+
+def _row_digest(digest, row):
+    digest.update(repr(row).encode())
+
+
+def _ingest_sheet(store, sheet, workbook, version, chunk_rows):
+    # Rows up to the last batch's watermark are only hashed; rows past it are appended
+    last = store.manifest['batches'][-1] if store.manifest and store.manifest['batches'] else None
+    resumable = last is not None and last.get('source') == 'xlsx' and last.get('sheet') == sheet.title
+    watermark = last['source_rows'] if resumable else 0
+
+    header, rows = _sheet_rows(sheet)
+    digest = hashlib.sha1(repr(header).encode())
+    seen = added = 0
+    chunk = []
+    deduper = None
+
+    def flush():
+        nonlocal added, deduper
+        with span('xlsx_clean', rows_in=len(chunk)) as stage:
+            df, quality = checked_observations(_typed_frame(header, chunk))[:2]
+            stage.rows_out = len(df)
+        hashes, duplicates = None, 0
+        if deduper is None:
+            deduper = store_deduper(store) or False
+        if deduper:
+            with span('dedupe', rows_in=len(df)) as stage:
+                before = deduper.duplicates
+                df, hashes = deduper.apply(df)
+                duplicates = deduper.duplicates - before
+                stage.rows_out = len(df)
+        with span('ingest_append', rows_in=len(df)):
+            df = add_date_dimension(df)
+            store.append(df, {
+                'source': 'xlsx',
+                'workbook': os.path.basename(workbook),
+                'sheet': sheet.title,
+                'source_rows': seen,
+                'duplicates': duplicates,
+                'quality': quality,
+                'rows_hash': digest.hexdigest(),
+                'file_version': version,
+                'ingested_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            }, hashes)
+        added += len(df)
+        chunk.clear()
+
+    if not resumable:
+        store.reset()
+    for row in rows:
+        _row_digest(digest, row)
+        seen += 1
+        if seen <= watermark:
+            if seen == watermark and digest.hexdigest() != last['rows_hash']:
+                # Rows before the watermark were edited: start this park over
+                return None
+            continue
+        chunk.append(row)
+        if len(chunk) >= chunk_rows:
+            flush()
+    if seen < watermark:
+        return None
+    if chunk:
+        flush()
+    return added
+
+
+def ingest_workbook(path, parks=None, root=None, rebuild=False, chunk_rows=XLSX_CHUNK_ROWS):
+    # One streaming pass over every park sheet of a habitat workbook; returns {park: new rows}
+    if openpyxl is None:
+        raise RuntimeError("Workbook ingest requires openpyxl")
+    habitat = os.path.basename(path).split('Bird_Monitoring_Data_', 1)[1].split('.', 1)[0]
+    version = dataset_version(path)
+    wanted = [park for park in HABITAT_PARKS[habitat] if parks is None or park in parks]
+
+    stores = {}
+    for park in wanted:
+        store = ParkStore(habitat, park, root)
+        last = store.manifest['batches'][-1] if store.manifest and store.manifest['batches'] else None
+        if rebuild:
+            store.reset()
+        elif last and last.get('source') == 'xlsx' and version in (last['file_version'], store.manifest.get('checked_version')):
+            continue
+        stores[park] = store
+    results = {park: 0 for park in wanted}
+    if not stores:
+        return results
+
+    with span('xlsx_open'):
+        book = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        for sheet in book.worksheets:
+            store = stores.get(sheet.title.strip())
+            if store is None:
+                continue
+            with span('xlsx_sheet') as stage:
+                added = _ingest_sheet(store, sheet, path, version, chunk_rows)
+                if added is None:
+                    store.reset()
+                    added = _ingest_sheet(store, sheet, path, version, chunk_rows)
+                if not added:
+                    # Re-saved with no new rows: remember this version so the next call skips
+                    store.mark_checked(version)
+                stage.rows_out = added
+            results[sheet.title.strip()] = added
+    finally:
+        book.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream the monitoring workbooks straight into the columnar store.")
+    parser.add_argument('workbooks', nargs='*', help="XLSX workbooks (default: both habitats, where present)")
+    parser.add_argument('--parks', help="comma separated park codes (default: every park sheet)")
+    parser.add_argument('--rebuild', action='store_true', help="discard the stored data and ingest from scratch")
+    parser.add_argument('--chunk-rows', type=int, default=XLSX_CHUNK_ROWS)
+    args = parser.parse_args()
+
+    workbooks = args.workbooks or [workbook_file(habitat) for habitat in HABITAT_PARKS
+                                   if os.path.exists(workbook_file(habitat))]
+    if not workbooks:
+        parser.error("No workbooks found")
+    parks = set(args.parks.split(',')) if args.parks else None
+    for path in workbooks:
+        start = time.perf_counter()
+        habitat = os.path.basename(path).split('Bird_Monitoring_Data_', 1)[1].split('.', 1)[0]
+        with ExitStack() as locks:
+            for park in sorted(park for park in HABITAT_PARKS[habitat] if parks is None or park in parks):
+                locks.enter_context(park_lock(habitat, park))
+            results = ingest_workbook(path, parks, rebuild=args.rebuild, chunk_rows=args.chunk_rows)
+        rows = ', '.join(f"{park} {count}" for park, count in results.items())
+        print(f"{os.path.basename(path)}: {rows} new rows in {time.perf_counter() - start:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,24 +2,12 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
-# Load the dataset
-df = pd.read_csv("Bird_Monitoring_Data_FOREST.XLSX - CATO.csv")
+from bird_data import data_file
+from bird_ingest import stored_observations
+from bird_pivot import year_month
 
-# Clean column names
-df.columns = df.columns.str.strip().str.lower().str.replace(" ", "_")
-
-# Convert data types
-df['date'] = pd.to_datetime(df['date'], errors='coerce')
-df['start_time'] = pd.to_datetime(df['start_time'], errors='coerce').dt.time
-df['end_time'] = pd.to_datetime(df['end_time'], errors='coerce').dt.time
-df['initial_three_min_cnt'] = pd.to_numeric(df['initial_three_min_cnt'], errors='coerce')
-
-# Drop missing critical fields
-df.dropna(subset=['common_name', 'date'], inplace=True)
-
-# Add year and month columns
-df['year'] = df['date'].dt.year
-df['month'] = df['date'].dt.month
+# Load the cleaned dataset from the columnar store; it carries integer year/month columns
+df = stored_observations(data_file('CATO'))
 
 # Fill missing count with 0
 df['initial_three_min_cnt'].fillna(0, inplace=True)
@@ -60,7 +48,7 @@ if 'observer' in df.columns:
 
 # -------------------------------
 # 4. Monthly trend (heatmap)
-monthly_trend = df.groupby(['year', 'month'])['initial_three_min_cnt'].sum().unstack().fillna(0)
+monthly_trend = year_month(df)
 
 plt.figure(figsize=(10, 6))
 sns.heatmap(monthly_trend, cmap='YlGnBu', annot=True, fmt=".0f")
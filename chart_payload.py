@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# Upper bound on what a single line chart sends to the browser
+MAX_LINE_POINTS = 500
+
+
+def lttb_indices(x, y, n_out):
+    # Largest-Triangle-Three-Buckets: keep the point of each bucket that spans
+    # the largest triangle with the previous pick and the next bucket's mean
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    picked = np.empty(n_out, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    prev = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[nxt_lo:nxt_hi].mean()
+        avg_y = y[nxt_lo:nxt_hi].mean()
+        area = np.abs((x[prev] - avg_x) * (y[lo:hi] - y[prev]) - (x[prev] - x[lo:hi]) * (avg_y - y[prev]))
+        prev = lo + int(np.argmax(area))
+        picked[i + 1] = prev
+    return picked
+
+
+def line_series(series, max_points=MAX_LINE_POINTS):
+    series = series.sort_index()
+    if len(series) <= max_points:
+        return series
+    index = series.index
+    x = index.asi8.astype(np.float64) if isinstance(index, pd.DatetimeIndex) else np.arange(len(series), dtype=np.float64)
+    y = series.to_numpy(dtype=np.float64)
+    return series.iloc[lttb_indices(x, y, max_points)]
+
+
+def payload_bytes(data):
+    # Streamlit ships charts and tables to the browser as Arrow IPC streams
+    if isinstance(data, pd.Series):
+        data = data.to_frame()
+    table = pa.Table.from_pandas(data)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().size
@@ -1,118 +1,128 @@
 import streamlit as st
-import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
+
+from bird_data import shared_observations
+from bird_diversity import render_diversity_panel
+from bird_filters import filter_positions
+from bird_removal import render_detectability_panel
+from chart_payload import line_series
+from figure_cache import barh_chart
+from filter_cache import RESULT_CACHE, cached_result
+from paged_table import render_paged_table
+from perf_spans import render_panel, span, start_run
 
 # Page config
 st.set_page_config(layout="wide")
 st.title("🐦 Bird Observation Dashboard with ID Method")
 
+# Optional per-stage timings for this rerun
+show_perf = st.sidebar.checkbox("⏱ Show Performance")
+start_run(show_perf)
+
 # Load dataset
 FILE = "Bird_Monitoring_Data_FOREST.XLSX - CHOH.csv"
 try:
-    df = pd.read_csv(FILE)
+    df, version = shared_observations(FILE)
 except FileNotFoundError:
     st.error(f"❌ File '{FILE}' not found.")
     st.stop()
 
-# Clean column names
-df.columns = df.columns.str.strip().str.lower().str.replace(" ", "_")
-
-# Type conversions
-df['date'] = pd.to_datetime(df['date'], errors='coerce')
-df['initial_three_min_cnt'] = pd.to_numeric(df['initial_three_min_cnt'], errors='coerce')
-df['temperature'] = pd.to_numeric(df['temperature'], errors='coerce')
-df['humidity'] = pd.to_numeric(df['humidity'], errors='coerce')
-
-# Drop missing critical fields
-df.dropna(subset=['date', 'common_name', 'initial_three_min_cnt'], inplace=True)
-
-# Optional: convert time fields
-for col in ['start_time', 'end_time']:
-    if col in df.columns:
-        df[col] = pd.to_datetime(df[col], errors='coerce').dt.time
-
 # Sidebar filters
 st.sidebar.header("🔍 Filters")
 
 # ✅ ID method (filter by ID if present)
-id_col = next((col for col in df.columns if 'id' in col), None)
-if id_col:
-    id_options = sorted(df[id_col].dropna().astype(str).unique())
+if 'id_method' in df.columns:
+    id_options = sorted(df['id_method'].dropna().astype(str).unique())
     selected_id = st.sidebar.selectbox("🎯 Filter by ID", ["-- All --"] + id_options)
 else:
     selected_id = "-- All --"
+id_method = None if selected_id == "-- All --" else selected_id
 
-# Apply ID filter first if selected
-if selected_id != "-- All --" and id_col:
-    df = df[df[id_col].astype(str) == selected_id]
+# Narrow the remaining options to the selected ID method
+scope = df.iloc[filter_positions(df, {'id_method': id_method})] if id_method else df
 
 # Year filter
-year_options = sorted(df['date'].dt.year.unique())
+year_options = sorted(scope['year'].unique())
 year = st.sidebar.selectbox("Year", year_options)
 
 # Species filter
-species_options = sorted(df['common_name'].dropna().unique())
+species_options = sorted(scope['common_name'].dropna().unique())
 species = st.sidebar.selectbox("Species", species_options)
 
 # Interval filter
 interval = None
 if 'interval_length' in df.columns:
-    interval_options = sorted(df['interval_length'].dropna().astype(str).unique())
+    interval_options = sorted(scope['interval_length'].dropna().astype(str).unique())
     interval = st.sidebar.selectbox("Interval Length", interval_options)
 
 # Date range
-min_date, max_date = df['date'].min(), df['date'].max()
+min_date, max_date = scope['date'].min(), scope['date'].max()
 date_range = st.sidebar.date_input("Date Range", [min_date, max_date], min_value=min_date, max_value=max_date)
 
 # Temperature filter
-if df['temperature'].notna().any():
-    temp_range = st.sidebar.slider("Temperature Range", int(df['temperature'].min()), int(df['temperature'].max()), (int(df['temperature'].min()), int(df['temperature'].max())))
+if scope['temperature'].notna().any():
+    temp_range = st.sidebar.slider("Temperature Range", int(scope['temperature'].min()), int(scope['temperature'].max()), (int(scope['temperature'].min()), int(scope['temperature'].max())))
 else:
     temp_range = None
 
 # Humidity filter
-if df['humidity'].notna().any():
-    hum_range = st.sidebar.slider("Humidity Range", int(df['humidity'].min()), int(df['humidity'].max()), (int(df['humidity'].min()), int(df['humidity'].max())))
+if scope['humidity'].notna().any():
+    hum_range = st.sidebar.slider("Humidity Range", int(scope['humidity'].min()), int(scope['humidity'].max()), (int(scope['humidity'].min()), int(scope['humidity'].max())))
 else:
     hum_range = None
 
 # Apply remaining filters
-filtered = df[
-    (df['date'].dt.year == year) &
-    (df['common_name'] == species)
-]
-
-if interval:
-    filtered = filtered[filtered['interval_length'].astype(str) == interval]
-
-if len(date_range) == 2:
-    start_date, end_date = pd.to_datetime(date_range[0]), pd.to_datetime(date_range[1])
-    filtered = filtered[(filtered['date'] >= start_date) & (filtered['date'] <= end_date)]
-
-if temp_range:
-    filtered = filtered[(filtered['temperature'] >= temp_range[0]) & (filtered['temperature'] <= temp_range[1])]
-
-if hum_range:
-    filtered = filtered[(filtered['humidity'] >= hum_range[0]) & (filtered['humidity'] <= hum_range[1])]
+spec = {
+    'park': 'CHOH',
+    'year': year,
+    'species': species,
+    'interval': interval,
+    'id_method': id_method,
+    'date_range': date_range,
+    'temp_range': temp_range,
+    'hum_range': hum_range,
+}
+
+
+def compute_result():
+    positions = filter_positions(df, spec)
+    filtered = df.iloc[positions]
+    with span('groupby', rows_in=len(filtered)) as stage:
+        time_series = line_series(filtered.groupby('date')['initial_three_min_cnt'].sum())
+        top10 = filtered.groupby('common_name')['initial_three_min_cnt'].sum().sort_values(ascending=False).head(10)
+        stage.rows_out = len(time_series)
+    return positions, time_series, top10
+
+
+positions, time_series, top10 = cached_result(FILE, version, spec, compute_result)
+total_count = df['initial_three_min_cnt'].to_numpy()[positions].sum()
+
+with st.sidebar.expander("⚙️ Result Cache"):
+    st.json(RESULT_CACHE.stats())
 
 # Output
 st.subheader("📋 Filtered Results")
-st.write(f"🔢 Total Records: {len(filtered)}")
-st.write(f"🐦 Total Bird Count: {int(filtered['initial_three_min_cnt'].sum())}")
+st.write(f"🔢 Total Records: {len(positions)}")
+st.write(f"🐦 Total Bird Count: {int(total_count)}")
 
-if not filtered.empty:
-    st.dataframe(filtered, use_container_width=True)
+if len(positions):
+    render_paged_table(st, df, FILE, version, spec, positions, list(df.columns), key='observations')
 
     st.subheader("📈 Observation Trend")
-    time_series = filtered.groupby('date')['initial_three_min_cnt'].sum()
     st.line_chart(time_series)
 
     st.subheader("🏆 Top 10 Most Observed Birds (Filtered)")
-    top10 = filtered.groupby('common_name')['initial_three_min_cnt'].sum().sort_values(ascending=False).head(10)
-    fig, ax = plt.subplots(figsize=(10, 5))
-    sns.barplot(x=top10.values, y=top10.index, palette='crest', ax=ax)
-    ax.set_title("Top 10 Bird Species")
-    st.pyplot(fig)
+    st.image(barh_chart(top10, "Top 10 Bird Species"))
 else:
     st.warning("⚠️ No records match the selected filters.")
+
+# Biodiversity indices (computed once for every park per dataset version)
+st.subheader("🌿 Biodiversity")
+render_diversity_panel(st, FILE)
+
+# Detectability from first-detection times (removal model), refreshed as new visits arrive
+st.subheader("🎯 Detectability")
+render_detectability_panel(st, FILE, df, species)
+
+# Performance panel
+if show_perf:
+    render_panel(st.sidebar)
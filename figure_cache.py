@@ -0,0 +1,66 @@
+import hashlib
+import io
+
+import pandas as pd
+import seaborn as sns
+from matplotlib.figure import Figure
+
+from filter_cache import FilterCache
+from perf_spans import span
+
+# Rendered chart bytes shared by every session, keyed by the aggregate data hash
+FIGURE_CACHE = FilterCache(max_entries=128, max_bytes=64 * 1024 * 1024, ttl=24 * 3600)
+
+
+def data_hash(series):
+    values = pd.util.hash_pandas_object(series, index=True).to_numpy()
+    return hashlib.sha1(values.tobytes()).hexdigest()
+
+
+def _render(fig, fmt, dpi):
+    # Figures are built without pyplot so they never enter its global registry
+    buf = io.BytesIO()
+    try:
+        fig.savefig(buf, format=fmt, dpi=dpi, bbox_inches='tight')
+    finally:
+        fig.clear()
+    return buf.getvalue()
+
+
+def barh_chart(series, title, xlabel=None, palette='crest', figsize=(10, 5), fmt='png', dpi=150):
+    spec = {'kind': 'barh', 'data': data_hash(series), 'title': title, 'xlabel': xlabel,
+            'palette': palette, 'figsize': figsize, 'fmt': fmt, 'dpi': dpi}
+
+    def render():
+        with span('render_' + fmt, rows_in=len(series)):
+            fig = Figure(figsize=figsize)
+            ax = fig.subplots()
+            sns.barplot(x=series.values, y=series.index.astype(str), hue=series.index.astype(str),
+                        palette=palette, legend=False, ax=ax)
+            ax.set_title(title)
+            if xlabel:
+                ax.set_xlabel(xlabel)
+            return _render(fig, fmt, dpi)
+
+    return FIGURE_CACHE.get_or_compute('figures', '', spec, render)
+
+
+def heatmap_chart(frame, title, xlabel=None, ylabel=None, cmap='YlGnBu', annot=True, fmt_annot='.0f',
+                  figsize=(10, 6), fmt='png', dpi=150):
+    spec = {'kind': 'heatmap', 'data': data_hash(frame), 'columns': [str(c) for c in frame.columns],
+            'title': title, 'xlabel': xlabel, 'ylabel': ylabel, 'cmap': cmap, 'annot': annot,
+            'fmt_annot': fmt_annot, 'figsize': figsize, 'fmt': fmt, 'dpi': dpi}
+
+    def render():
+        with span('render_' + fmt, rows_in=frame.size):
+            fig = Figure(figsize=figsize)
+            ax = fig.subplots()
+            sns.heatmap(frame, cmap=cmap, annot=annot, fmt=fmt_annot, ax=ax)
+            ax.set_title(title)
+            if xlabel:
+                ax.set_xlabel(xlabel)
+            if ylabel:
+                ax.set_ylabel(ylabel)
+            return _render(fig, fmt, dpi)
+
+    return FIGURE_CACHE.get_or_compute('figures', '', spec, render)
@@ -0,0 +1,114 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from bird_filters import spec_key
+
+
+def estimate_nbytes(value):
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if hasattr(usage, 'sum') else int(usage)
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(estimate_nbytes(v) for v in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_nbytes(v) for v in value.values())
+    return sys.getsizeof(value)
+
+
+class FilterCache:
+    """Process-wide LRU cache of filter results keyed by (dataset, version, spec)."""
+
+    def __init__(self, max_entries=256, max_bytes=256 * 1024 * 1024, ttl=600.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, nbytes, expires_at, dataset)
+        self._versions = {}  # dataset -> current version
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _drop(self, key):
+        _, nbytes, _, _ = self._entries.pop(key)
+        self._nbytes -= nbytes
+
+    def _check_version(self, dataset, version):
+        # A new dataset version makes every entry of the old one unreachable
+        if self._versions.get(dataset) == version:
+            return
+        stale = [key for key, entry in self._entries.items() if entry[3] == dataset]
+        for key in stale:
+            self._drop(key)
+        self.invalidations += len(stale)
+        self._versions[dataset] = version
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._nbytes > self.max_bytes):
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def get_or_compute(self, dataset, version, spec, compute):
+        key = spec_key(spec, (dataset, version))
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(dataset, version)
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[2] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                self._drop(key)
+                self.expirations += 1
+            self.misses += 1
+
+        # Compute outside the lock so other sessions are not blocked
+        value = compute()
+        nbytes = estimate_nbytes(value)
+        with self._lock:
+            if self._versions.get(dataset) != version or nbytes > self.max_bytes:
+                return value
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, nbytes, now + self.ttl, dataset)
+            self._nbytes += nbytes
+            self._evict()
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self._nbytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._nbytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+
+# Shared by every Streamlit session in the server process
+RESULT_CACHE = FilterCache()
+
+
+def cached_result(dataset, version, spec, compute):
+    return RESULT_CACHE.get_or_compute(dataset, version, spec, compute)
@@ -1,47 +1,36 @@
 import streamlit as st
-import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
+
+from bird_data import shared_observations
+from bird_diversity import render_diversity_panel
+from bird_filters import filter_positions
+from bird_removal import render_detectability_panel
+from chart_payload import line_series
+from figure_cache import barh_chart
+from filter_cache import RESULT_CACHE, cached_result
+from paged_table import render_paged_table
+from perf_spans import render_panel, span, start_run
 
 # Page setup
 st.set_page_config(layout="wide")
 st.title("🌿 Bird Observation Dashboard - GWMP (with Scientific Names, Weather & ID Method)")
 
+# Optional per-stage timings for this rerun
+show_perf = st.sidebar.checkbox("⏱ Show Performance")
+start_run(show_perf)
+
 # Load dataset
 FILE = "Bird_Monitoring_Data_FOREST.XLSX - GWMP.csv"
 try:
-    df = pd.read_csv(FILE)
+    df, version = shared_observations(FILE)
 except FileNotFoundError:
     st.error(f"❌ File '{FILE}' not found.")
     st.stop()
 
-# Clean column names
-df.columns = df.columns.str.strip().str.lower().str.replace(" ", "_")
-
-# Convert date/time/count fields
-df['date'] = pd.to_datetime(df['date'], errors='coerce')
-df['initial_three_min_cnt'] = pd.to_numeric(df['initial_three_min_cnt'], errors='coerce')
-for time_col in ['start_time', 'end_time']:
-    if time_col in df.columns:
-        df[time_col] = pd.to_datetime(df[time_col], errors='coerce').dt.time
-
-# Drop incomplete rows
-df.dropna(subset=['date', 'common_name', 'initial_three_min_cnt'], inplace=True)
-
-# Combine common and scientific names
-df['full_name'] = df['common_name']
-if 'scientific_name' in df.columns:
-    df['scientific_name'] = df['scientific_name'].fillna("").str.strip()
-    df['full_name'] = df.apply(
-        lambda row: f"{row['common_name']} ({row['scientific_name']})" if row['scientific_name'] else row['common_name'],
-        axis=1
-    )
-
 # Sidebar filters
 st.sidebar.header("🔍 Filters")
 
 # Year filter
-year_options = sorted(df['date'].dt.year.unique())
+year_options = sorted(df['year'].unique())
 year = st.sidebar.selectbox("Select Year", year_options)
 
 # Species filter
@@ -56,7 +45,7 @@ else:
     interval = None
 
 # Temperature filter
-if 'temperature' in df.columns:
+if 'temperature' in df.columns and df['temperature'].notna().any():
     min_temp = int(df['temperature'].min())
     max_temp = int(df['temperature'].max())
     temp_range = st.sidebar.slider("Select Temperature Range (°C)", min_value=min_temp, max_value=max_temp,
@@ -65,7 +54,7 @@ else:
     temp_range = None
 
 # Humidity filter
-if 'humidity' in df.columns:
+if 'humidity' in df.columns and df['humidity'].notna().any():
     min_hum = int(df['humidity'].min())
     max_hum = int(df['humidity'].max())
     hum_range = st.sidebar.slider("Select Humidity Range (%)", min_value=min_hum, max_value=max_hum,
@@ -84,47 +73,70 @@ else:
 min_date, max_date = df['date'].min(), df['date'].max()
 date_range = st.sidebar.date_input("Select Date Range", [min_date, max_date], min_value=min_date, max_value=max_date)
 
-# Apply filters
-filtered = df.copy()
-filtered = filtered[filtered['date'].dt.year == year]
-filtered = filtered[filtered['full_name'] == species]
+# Apply filters (shared across sessions through the result cache)
+spec = {
+    'park': 'GWMP',
+    'year': year,
+    'species': species,
+    'species_field': 'full_name',
+    'interval': interval,
+    'id_method': id_method,
+    'date_range': date_range,
+    'temp_range': temp_range,
+    'hum_range': hum_range,
+}
 
-if interval:
-    filtered = filtered[filtered['interval_length'].astype(str) == interval]
 
-if temp_range:
-    filtered = filtered[(filtered['temperature'] >= temp_range[0]) & (filtered['temperature'] <= temp_range[1])]
+def compute_result():
+    positions = filter_positions(df, spec)
+    filtered = df.iloc[positions]
+    with span('groupby', rows_in=len(filtered)) as stage:
+        daily_counts = line_series(filtered.groupby('date')['initial_three_min_cnt'].sum())
+        stage.rows_out = len(daily_counts)
+    return positions, daily_counts
 
-if hum_range:
-    filtered = filtered[(filtered['humidity'] >= hum_range[0]) & (filtered['humidity'] <= hum_range[1])]
 
-if id_method:
-    filtered = filtered[filtered['id_method'] == id_method]
+positions, daily_counts = cached_result(FILE, version, spec, compute_result)
+total_count = df['initial_three_min_cnt'].to_numpy()[positions].sum()
 
-if len(date_range) == 2:
-    start, end = pd.to_datetime(date_range[0]), pd.to_datetime(date_range[1])
-    filtered = filtered[(filtered['date'] >= start) & (filtered['date'] <= end)]
+# Cache statistics
+with st.sidebar.expander("⚙️ Result Cache"):
+    st.json(RESULT_CACHE.stats())
 
 # Display section
 st.subheader(f"📅 Observations for {species} in {year}")
-st.write(f"🔢 Total Records: {len(filtered)}")
-st.write(f"🐦 Total Bird Count: {int(filtered['initial_three_min_cnt'].sum())}")
+st.write(f"🔢 Total Records: {len(positions)}")
+st.write(f"🐦 Total Bird Count: {int(total_count)}")
 
-if not filtered.empty:
+if len(positions):
     st.subheader("📈 Daily Bird Count")
-    daily_counts = filtered.groupby('date')['initial_three_min_cnt'].sum()
     st.line_chart(daily_counts)
 
     st.subheader("📊 Filtered Observation Data")
-    st.dataframe(filtered[['date', 'full_name', 'initial_three_min_cnt', 'temperature', 'humidity', 'id_method']])
+    render_paged_table(st, df, FILE, version, spec, positions, ['date', 'full_name', 'initial_three_min_cnt', 'temperature', 'humidity', 'id_method'], key='observations')
 else:
     st.warning("⚠️ No data available for the selected filters.")
 
-# Top 10 chart
+# Top 10 chart (rendered once per dataset version and shared by all sessions)
 st.subheader("🏆 Top 10 Most Observed Bird Species (Overall)")
-top_species = df.groupby('full_name')['initial_three_min_cnt'].sum().sort_values(ascending=False).head(10)
-fig, ax = plt.subplots(figsize=(10, 5))
-sns.barplot(x=top_species.values, y=top_species.index, palette='crest', ax=ax)
-ax.set_title("Top 10 Bird Species")
-ax.set_xlabel("Total Count")
-st.pyplot(fig)
+
+
+def compute_top10_chart():
+    with span('groupby_top10', rows_in=len(df)):
+        top_species = df.groupby('full_name')['initial_three_min_cnt'].sum().sort_values(ascending=False).head(10)
+    return barh_chart(top_species, "Top 10 Bird Species", xlabel="Total Count")
+
+
+st.image(cached_result(FILE, version, {'park': 'GWMP', 'chart': 'top10'}, compute_top10_chart))
+
+# Biodiversity indices (computed once for every park per dataset version)
+st.subheader("🌿 Biodiversity")
+render_diversity_panel(st, FILE)
+
+# Detectability from first-detection times (removal model), refreshed as new visits arrive
+st.subheader("🎯 Detectability")
+render_detectability_panel(st, FILE, df, df.loc[df['full_name'] == species, 'common_name'].iloc[0])
+
+# Performance panel
+if show_perf:
+    render_panel(st.sidebar)
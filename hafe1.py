@@ -1,39 +1,35 @@
 import streamlit as st
-import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
+
+from bird_data import shared_observations
+from bird_diversity import render_diversity_panel
+from bird_filters import filter_positions
+from bird_removal import render_detectability_panel
+from chart_payload import line_series
+from filter_cache import RESULT_CACHE, cached_result
+from paged_table import render_paged_table
+from perf_spans import render_panel, span, start_run
 
 # Page setup
 st.set_page_config(layout="wide")
 st.title("🪶 HAFE Bird Observation Dashboard with Filters")
 
+# Optional per-stage timings for this rerun
+show_perf = st.sidebar.checkbox("⏱ Show Performance")
+start_run(show_perf)
+
 # Load the CSV
 file_path = "Bird_Monitoring_Data_FOREST.XLSX - HAFE.csv"
 try:
-    df = pd.read_csv(file_path)
+    df, version = shared_observations(file_path)
 except FileNotFoundError:
     st.error(f"❌ File '{file_path}' not found.")
     st.stop()
 
-# Clean column names
-df.columns = df.columns.str.strip().str.lower().str.replace(" ", "_")
-
-# Convert data types
-df['date'] = pd.to_datetime(df['date'], errors='coerce')
-df['start_time'] = pd.to_datetime(df['start_time'], errors='coerce').dt.time
-df['end_time'] = pd.to_datetime(df['end_time'], errors='coerce').dt.time
-df['initial_three_min_cnt'] = pd.to_numeric(df['initial_three_min_cnt'], errors='coerce')
-df['temperature'] = pd.to_numeric(df['temperature'], errors='coerce')
-df['humidity'] = pd.to_numeric(df['humidity'], errors='coerce')
-
-# Drop rows missing essential info
-df.dropna(subset=['common_name', 'date'], inplace=True)
-
 # --- Sidebar Filters ---
 st.sidebar.header("🔍 Filters")
 
 # Year
-years = sorted(df['date'].dt.year.dropna().unique())
+years = sorted(df['year'].unique())
 selected_year = st.sidebar.selectbox("Select Year", years)
 
 # Species
@@ -72,42 +68,45 @@ else:
     hum_range = None
 
 # --- Apply Filters ---
-filtered = df[
-    (df['date'].dt.year == selected_year) &
-    (df['common_name'] == selected_species)
-]
+spec = {
+    'park': 'HAFE',
+    'year': selected_year,
+    'species': selected_species,
+    'interval': selected_interval,
+    'id_method': selected_id_method,
+    'date_range': selected_range,
+    'temp_range': temp_range,
+    'hum_range': hum_range,
+}
 
-if selected_interval:
-    filtered = filtered[filtered['interval_length'].astype(str) == selected_interval]
 
-if selected_id_method:
-    filtered = filtered[filtered['id_method'].astype(str) == selected_id_method]
+def compute_result():
+    positions = filter_positions(df, spec)
+    filtered = df.iloc[positions]
+    with span('groupby', rows_in=len(filtered)) as stage:
+        daily_counts = line_series(filtered.groupby('date')['initial_three_min_cnt'].sum())
+        stage.rows_out = len(daily_counts)
+    return positions, daily_counts
 
-if len(selected_range) == 2:
-    start_date, end_date = pd.to_datetime(selected_range[0]), pd.to_datetime(selected_range[1])
-    filtered = filtered[(filtered['date'] >= start_date) & (filtered['date'] <= end_date)]
 
-if temp_range:
-    filtered = filtered[(df['temperature'] >= temp_range[0]) & (df['temperature'] <= temp_range[1])]
+positions, daily = cached_result(file_path, version, spec, compute_result)
+total_count = df['initial_three_min_cnt'].to_numpy()[positions].sum()
 
-if hum_range:
-    filtered = filtered[(df['humidity'] >= hum_range[0]) & (df['humidity'] <= hum_range[1])]
+with st.sidebar.expander("⚙️ Result Cache"):
+    st.json(RESULT_CACHE.stats())
 
 # --- Display Results ---
 st.subheader(f"📊 Observations for '{selected_species}' in {selected_year}")
-st.write(f"🔢 Total Records: {len(filtered)}")
-st.write(f"🐦 Total Bird Count: {filtered['initial_three_min_cnt'].sum()}")
+st.write(f"🔢 Total Records: {len(positions)}")
+st.write(f"🐦 Total Bird Count: {int(total_count)}")
 
 # Chart
-if not filtered.empty:
-    daily = filtered.groupby('date')['initial_three_min_cnt'].sum()
+if len(positions):
     st.line_chart(daily)
 
-    st.dataframe(filtered[['date', 'common_name', 'scientific_name' if 'scientific_name' in df.columns else 'common_name', 
-                           'interval_length' if 'interval_length' in df.columns else None,
-                           'temperature' if 'temperature' in df.columns else None,
-                           'humidity' if 'humidity' in df.columns else None,
-                           'initial_three_min_cnt']])
+    table_columns = [col for col in ['date', 'common_name', 'scientific_name', 'interval_length',
+                                     'temperature', 'humidity', 'initial_three_min_cnt'] if col in df.columns]
+    render_paged_table(st, df, file_path, version, spec, positions, table_columns, key='observations')
 else:
     st.warning("No data available for selected filters.")
 
@@ -115,3 +114,15 @@ else:
 st.subheader("🏆 Top 10 Bird Species (Overall)")
 top_species = df.groupby('common_name')['initial_three_min_cnt'].sum().sort_values(ascending=False).head(10)
 st.bar_chart(top_species)
+
+# Biodiversity indices (computed once for every park per dataset version)
+st.subheader("🌿 Biodiversity")
+render_diversity_panel(st, file_path)
+
+# Detectability from first-detection times (removal model), refreshed as new visits arrive
+st.subheader("🎯 Detectability")
+render_detectability_panel(st, file_path, df, selected_species)
+
+# Performance panel
+if show_perf:
+    render_panel(st.sidebar)
@@ -0,0 +1,153 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from streamlit.testing.v1 import AppTest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def change_filter(at, rng):
+    # Mimic a user touching one sidebar widget: pick a new option or narrow a range
+    widgets = [('selectbox', w) for w in at.sidebar.selectbox if len(w.options) > 1]
+    widgets += [('slider', w) for w in at.sidebar.slider if w.max > w.min]
+    if not widgets:
+        return False
+    kind, widget = rng.choice(widgets)
+    if kind == 'selectbox':
+        widget.select_index(rng.randrange(len(widget.options)))
+    else:
+        low = rng.randint(widget.min, widget.max)
+        high = rng.randint(low, widget.max)
+        widget.set_range(low, high)
+    return True
+
+
+def replay_session(script, steps, seed, timeout):
+    rng = random.Random(seed)
+    at = AppTest.from_file(script, default_timeout=timeout)
+    cpu_start = sum(os.times()[:2])
+
+    # The first run pays for imports and data loading; keep it out of the percentiles
+    start = time.perf_counter()
+    at.run()
+    cold = time.perf_counter() - start
+    errors = len(at.exception)
+
+    latencies = []
+    for _ in range(steps):
+        if not change_filter(at, rng):
+            break
+        start = time.perf_counter()
+        at.run()
+        latencies.append(time.perf_counter() - start)
+        errors += len(at.exception)
+    cpu = sum(os.times()[:2]) - cpu_start
+    # ru_maxrss is reported in KB on Linux; it is this worker's peak, which is the session's own
+    # because every worker runs exactly one session
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return latencies, errors, cpu, peak_rss, cold, os.getpid()
+
+
+def run_load(script, n_sessions, steps, seed, timeout):
+    # AppTest swaps process-global runtime state on every run, so overlapping
+    # sessions cannot share one interpreter. Each session gets a fresh worker
+    # (max_tasks_per_child=1 needs the spawn start method), so per-worker peak RSS
+    # is per-session peak RSS.
+    wall_start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=n_sessions, mp_context=multiprocessing.get_context('spawn'),
+                             max_tasks_per_child=1) as pool:
+        futures = [pool.submit(replay_session, script, steps, seed + i, timeout) for i in range(n_sessions)]
+        results = [f.result() for f in futures]
+    wall = time.perf_counter() - wall_start
+
+    latencies = np.array([lat for session in results for lat in session[0]]) * 1000
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (0.0, 0.0, 0.0)
+    cpu = sum(session[2] for session in results)
+    peak_rss = [session[3] for session in results]
+    return {
+        'sessions': n_sessions,
+        'workers': len({session[5] for session in results}),
+        'reruns': int(len(latencies)),
+        'errors': int(sum(session[1] for session in results)),
+        'cold_ms': round(max(session[4] for session in results) * 1000, 2),
+        'p50_ms': round(float(p50), 2),
+        'p95_ms': round(float(p95), 2),
+        'p99_ms': round(float(p99), 2),
+        'wall_s': round(wall, 3),
+        'cpu_s': round(cpu, 3),
+        'cpu_s_per_session': round(cpu / n_sessions, 3),
+        'peak_rss_mb': round(sum(peak_rss) / 1e6, 1),
+        'peak_rss_mb_per_session': round(max(peak_rss) / 1e6, 1),
+    }
+
+
+def git_revision():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_report(report, baseline=None):
+    base_rows = {}
+    if baseline:
+        base_rows = {row['sessions']: row for row in baseline['results']}
+        print(f"Comparing {report['revision']} against {baseline.get('revision')}")
+    print(f"{report['script']}")
+    print(f"{'sessions':>8} {'workers':>7} {'reruns':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'cpu s':>8} "
+          f"{'rss MB':>8} {'MB/sess':>8} {'errors':>6}")
+    for row in report['results']:
+        line = (f"{row['sessions']:>8} {row.get('workers', '-'):>7} {row['reruns']:>7} {row['p50_ms']:>9.1f} "
+                f"{row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['cpu_s']:>8.2f} {row['peak_rss_mb']:>8.1f} "
+                f"{row['peak_rss_mb_per_session']:>8.1f} {row['errors']:>6}")
+        base = base_rows.get(row['sessions'])
+        if base and base['p95_ms']:
+            line += f"   p95 {row['p95_ms'] / base['p95_ms'] - 1:+.0%}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay concurrent filter changes against a Streamlit dashboard.")
+    parser.add_argument('script', help="dashboard script, e.g. mana1.py")
+    parser.add_argument('--sessions', default='1,5,10,25', help="comma separated session counts")
+    parser.add_argument('--steps', type=int, default=20, help="filter changes per session")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--output', help="write the JSON report here")
+    parser.add_argument('--compare', help="previous JSON report to compare against")
+    args = parser.parse_args()
+
+    script = os.path.abspath(args.script)
+    report = {
+        'script': os.path.basename(script),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'steps': args.steps,
+        'seed': args.seed,
+        'results': [run_load(script, int(n), args.steps, args.seed, args.timeout)
+                    for n in args.sessions.split(',')],
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(report, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,35 @@
 import streamlit as st
-import pandas as pd
+
+from bird_data import shared_observations
+from bird_diversity import render_diversity_panel
+from bird_filters import filter_positions
+from bird_removal import render_detectability_panel
+from chart_payload import line_series
+from filter_cache import RESULT_CACHE, cached_result
+from paged_table import render_paged_table
+from perf_spans import render_panel, span, start_run
 
 # Page setup
 st.set_page_config(layout="wide")
 st.title("🐦 Bird Species Observation Dashboard - MANA")
 
+# Optional per-stage timings for this rerun
+show_perf = st.sidebar.checkbox("⏱ Show Performance")
+start_run(show_perf)
+
 # Load data
+FILE = "Bird_Monitoring_Data_FOREST.XLSX - MANA.csv"
 try:
-    df = pd.read_csv("Bird_Monitoring_Data_FOREST.XLSX - MANA.csv")
+    df, version = shared_observations(FILE)
 except FileNotFoundError:
     st.error("❌ File not found.")
     st.stop()
 
-# Clean column names
-df.columns = df.columns.str.strip().str.lower().str.replace(" ", "_")
-
-# Convert columns
-df['date'] = pd.to_datetime(df['date'], errors='coerce')
-df['initial_three_min_cnt'] = pd.to_numeric(df['initial_three_min_cnt'], errors='coerce')
-df['temperature'] = pd.to_numeric(df['temperature'], errors='coerce')
-df['humidity'] = pd.to_numeric(df['humidity'], errors='coerce')
-
-# Optional time fields
-for col in ['start_time', 'end_time']:
-    if col in df.columns:
-        df[col] = pd.to_datetime(df[col], errors='coerce').dt.time
-
-# Drop missing essential rows
-df.dropna(subset=['date', 'common_name', 'initial_three_min_cnt'], inplace=True)
-
 # Sidebar filters
 st.sidebar.header("🔍 Filters")
 
 # Filter: Year
-year_options = sorted(df['date'].dt.year.unique())
+year_options = sorted(df['year'].unique())
 year = st.sidebar.selectbox("Select Year", year_options)
 
 # Filter: Species
@@ -45,7 +41,6 @@ interval = None
 if 'interval_length' in df.columns:
     interval_options = sorted(df['interval_length'].dropna().astype(str).unique())
     interval = st.sidebar.selectbox("Select Interval Length", interval_options)
-    df['interval_length'] = df['interval_length'].astype(str).str.strip()
 
 # Filter: ID Method (if present)
 id_method = None
@@ -68,33 +63,44 @@ hum_max = int(df['humidity'].max()) if not df['humidity'].isnull().all() else 10
 hum_range = st.sidebar.slider("Humidity Range (%)", hum_min, hum_max, (hum_min, hum_max))
 
 # Apply filters
-filtered = df[
-    (df['date'].dt.year == year) &
-    (df['common_name'] == species) &
-    (df['date'] >= pd.to_datetime(date_range[0])) &
-    (df['date'] <= pd.to_datetime(date_range[1])) &
-    (df['temperature'].between(temp_range[0], temp_range[1], inclusive='both')) &
-    (df['humidity'].between(hum_range[0], hum_range[1], inclusive='both'))
-]
+spec = {
+    'park': 'MANA',
+    'year': year,
+    'species': species,
+    'interval': interval,
+    'id_method': id_method,
+    'date_range': date_range,
+    'temp_range': temp_range,
+    'hum_range': hum_range,
+}
 
-if interval:
-    filtered = filtered[filtered['interval_length'] == interval]
 
-if id_method:
-    filtered = filtered[filtered['id_method'] == id_method]
+def compute_result():
+    positions = filter_positions(df, spec)
+    filtered = df.iloc[positions]
+    with span('groupby', rows_in=len(filtered)) as stage:
+        daily_counts = line_series(filtered.groupby('date')['initial_three_min_cnt'].sum())
+        stage.rows_out = len(daily_counts)
+    return positions, daily_counts
+
+
+positions, daily_counts = cached_result(FILE, version, spec, compute_result)
+total_count = df['initial_three_min_cnt'].to_numpy()[positions].sum()
+
+with st.sidebar.expander("⚙️ Result Cache"):
+    st.json(RESULT_CACHE.stats())
 
 # Display summary
 st.subheader(f"📊 Filtered Observations for '{species}' in {year}")
-st.write(f"🔢 Records Found: {len(filtered)}")
-st.write(f"🐦 Total Bird Count: {filtered['initial_three_min_cnt'].sum()}")
+st.write(f"🔢 Records Found: {len(positions)}")
+st.write(f"🐦 Total Bird Count: {int(total_count)}")
 
 # Line chart (daily trend)
-if not filtered.empty:
-    daily_counts = filtered.groupby('date')['initial_three_min_cnt'].sum()
+if len(positions):
     st.line_chart(daily_counts)
 
     # Table display
-    st.dataframe(filtered[['date', 'common_name', 'initial_three_min_cnt', 'temperature', 'humidity']])
+    render_paged_table(st, df, FILE, version, spec, positions, ['date', 'common_name', 'initial_three_min_cnt', 'temperature', 'humidity'], key='observations')
 else:
     st.warning("No data matches the selected filters.")
 
@@ -102,3 +108,15 @@ else:
 st.subheader("🏆 Top 10 Most Observed Bird Species (Overall)")
 top_species = df.groupby('common_name')['initial_three_min_cnt'].sum().sort_values(ascending=False).head(10)
 st.bar_chart(top_species)
+
+# Biodiversity indices (computed once for every park per dataset version)
+st.subheader("🌿 Biodiversity")
+render_diversity_panel(st, FILE)
+
+# Detectability from first-detection times (removal model), refreshed as new visits arrive
+st.subheader("🎯 Detectability")
+render_detectability_panel(st, FILE, df, species)
+
+# Performance panel
+if show_perf:
+    render_panel(st.sidebar)
@@ -47,14 +47,14 @@ min_date, max_date = df['date'].min(), df['date'].max()
 date_range = st.sidebar.date_input("Select Date Range", [min_date, max_date], min_value=min_date, max_value=max_date)
 
 # Temperature Range
-if 'temperature' in df.columns:
+if 'temperature' in df.columns and df['temperature'].notna().any():
     temp_min, temp_max = int(df['temperature'].min()), int(df['temperature'].max())
     temperature = st.sidebar.slider("Temperature Range (°C)", temp_min, temp_max, (temp_min, temp_max))
 else:
     temperature = None
 
 # Humidity Range
-if 'humidity' in df.columns:
+if 'humidity' in df.columns and df['humidity'].notna().any():
     hum_min, hum_max = int(df['humidity'].min()), int(df['humidity'].max())
     humidity = st.sidebar.slider("Humidity Range (%)", hum_min, hum_max, (hum_min, hum_max))
 else:
@@ -47,7 +47,7 @@ else:
     id_method = None
 
 # Temperature Range
-if 'temperature' in df.columns:
+if 'temperature' in df.columns and df['temperature'].notna().any():
     min_temp = int(df['temperature'].min())
     max_temp = int(df['temperature'].max())
     temp_range = st.sidebar.slider("Temperature (°C)", min_temp, max_temp, (min_temp, max_temp))
@@ -55,7 +55,7 @@ else:
     temp_range = None
 
 # Humidity Range
-if 'humidity' in df.columns:
+if 'humidity' in df.columns and df['humidity'].notna().any():
     min_hum = int(df['humidity'].min())
     max_hum = int(df['humidity'].max())
     hum_range = st.sidebar.slider("Humidity (%)", min_hum, max_hum, (min_hum, max_hum))
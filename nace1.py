@@ -45,7 +45,7 @@ else:
     interval = None
 
 # Temperature Range Filter
-if 'temperature' in df.columns:
+if 'temperature' in df.columns and df['temperature'].notna().any():
     min_temp = int(df['temperature'].min())
     max_temp = int(df['temperature'].max())
     temp_range = st.sidebar.slider("Select Temperature Range (°C)", min_temp, max_temp, (min_temp, max_temp))
@@ -53,7 +53,7 @@ else:
     temp_range = None
 
 # Humidity Range Filter
-if 'humidity' in df.columns:
+if 'humidity' in df.columns and df['humidity'].notna().any():
     min_hum = int(df['humidity'].min())
     max_hum = int(df['humidity'].max())
     hum_range = st.sidebar.slider("Select Humidity Range (%)", min_hum, max_hum, (min_hum, max_hum))
@@ -0,0 +1,67 @@
+import math
+
+import numpy as np
+
+from bird_data import all_data_files, parse_data_file
+from bird_export import spooled_export
+from filter_cache import cached_result
+
+PAGE_SIZES = [25, 50, 100, 250]
+
+
+def sort_ranks(df, dataset, version, column):
+    # rank[i] is row i's place in the whole dataset ordered by column; built once per version
+    def compute():
+        ranks = df[column].rank(method='first', na_option='bottom').to_numpy()
+        return ranks.astype(np.int64) - 1
+
+    return cached_result(dataset, version, {'sort_ranks': column}, compute)
+
+
+def sorted_positions(df, dataset, version, spec, positions, column, descending=False):
+    if column is None:
+        return positions[::-1] if descending else positions
+
+    def compute():
+        ranks = sort_ranks(df, dataset, version, column)[positions]
+        order = positions[np.argsort(ranks, kind='stable')]
+        return order[::-1].copy() if descending else order
+
+    return cached_result(dataset, version, {**spec, 'sort_by': column, 'descending': descending}, compute)
+
+
+def page_slice(n_rows, page, page_size):
+    n_pages = max(1, math.ceil(n_rows / page_size))
+    page = min(max(page, 1), n_pages)
+    start = (page - 1) * page_size
+    return start, min(start + page_size, n_rows), n_pages
+
+
+def render_paged_table(container, df, dataset, version, spec, positions, columns, key):
+    controls = container.columns(4)
+    sort_by = controls[0].selectbox("Sort by", ["(file order)"] + list(columns), key=f"{key}_sort")
+    sort_by = None if sort_by == "(file order)" else sort_by
+    descending = controls[1].checkbox("Descending", key=f"{key}_desc")
+    page_size = controls[2].selectbox("Rows per page", PAGE_SIZES, index=1, key=f"{key}_size")
+    n_pages = max(1, math.ceil(len(positions) / page_size))
+    page = controls[3].number_input("Page", min_value=1, max_value=n_pages, value=1, key=f"{key}_page")
+
+    # Only the visible page is materialized and sent to the browser
+    ordered = sorted_positions(df, dataset, version, spec, positions, sort_by, descending)
+    start, stop, n_pages = page_slice(len(ordered), int(page), page_size)
+    container.dataframe(df.iloc[ordered[start:stop]][columns], hide_index=True)
+    container.caption(f"Rows {start + 1 if stop else 0}–{stop} of {len(ordered)} (page {int(page)} of {n_pages})")
+
+    # Export the full result with the same filter spec, streamed in chunks on click
+    habitat, park = parse_data_file(dataset)
+    export_cols = container.columns(3)
+    scope = export_cols[0].selectbox("Export scope", [f"{park} only", "All parks"], key=f"{key}_scope")
+    fmt = export_cols[1].selectbox("Export format", ['csv', 'parquet'], key=f"{key}_fmt")
+    files = {(habitat, park): dataset} if scope != "All parks" else all_data_files()
+    export_cols[2].download_button(
+        "⬇️ Download full result",
+        data=lambda: spooled_export(spec, files, fmt),
+        file_name=f"{park if scope != 'All parks' else 'all_parks'}_filtered.{fmt}",
+        mime="text/csv" if fmt == 'csv' else "application/octet-stream",
+        key=f"{key}_export",
+    )
@@ -0,0 +1,120 @@
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Spans are recorded when BIRD_PERF=1 or when a session turns them on for its run
+ENABLED = os.environ.get('BIRD_PERF') == '1'
+# tracemalloc slows every allocation in the process and its counters are process-wide, so memory
+# is only traced when the whole process opted in with BIRD_PERF=1; a session's own toggle gets
+# timings and row counts only
+TRACE_MEMORY = ENABLED
+
+logger = logging.getLogger('bird.perf')
+if os.environ.get('BIRD_PERF_LOG'):
+    _handler = logging.FileHandler(os.environ['BIRD_PERF_LOG'])
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+
+_local = threading.local()
+
+
+class Span:
+    __slots__ = ('name', 'rows_in', 'rows_out', 'seconds', 'alloc_bytes', 'peak_bytes')
+
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.seconds = 0.0
+        self.alloc_bytes = None
+        self.peak_bytes = None
+
+    def as_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+class _NullSpan:
+    # Shared sink for rows_out assignments while instrumentation is off
+    __slots__ = ('rows_out',)
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def enabled():
+    return getattr(_local, 'enabled', ENABLED)
+
+
+def start_run(enable=None):
+    if enable is not None:
+        _local.enabled = enable or ENABLED
+    _local.spans = []
+
+
+def recorded():
+    return list(getattr(_local, 'spans', []))
+
+
+@contextmanager
+def span(name, rows_in=None):
+    # alloc_bytes and peak_bytes come from the process-wide tracemalloc counters, so concurrent
+    # sessions add to each other's numbers. The peak is only reset by the outermost span of a
+    # thread; spans nested inside it leave peak_bytes unset rather than clobber it.
+    if not enabled():
+        yield _NULL_SPAN
+        return
+
+    record = Span(name, rows_in)
+    depth = getattr(_local, 'depth', 0)
+    _local.depth = depth + 1
+    if TRACE_MEMORY:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        start_bytes = tracemalloc.get_traced_memory()[0]
+        if depth == 0:
+            tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record.seconds = time.perf_counter() - start
+        _local.depth = depth
+        if TRACE_MEMORY:
+            current, peak = tracemalloc.get_traced_memory()
+            record.alloc_bytes = current - start_bytes
+            if depth == 0:
+                record.peak_bytes = peak - start_bytes
+        if not hasattr(_local, 'spans'):
+            _local.spans = []
+        _local.spans.append(record)
+        logger.info(json.dumps({'event': 'span', 'thread': threading.current_thread().name, **record.as_dict()}))
+
+
+def _kb(value):
+    return None if value is None else round(value / 1024, 1)
+
+
+def render_panel(container):
+    spans = recorded()
+    container.subheader("⏱ Performance")
+    if not spans:
+        container.caption("No stages ran in this rerun (cached results were reused).")
+        return
+    container.dataframe([
+        {
+            'stage': s.name,
+            'ms': round(s.seconds * 1000, 2),
+            'rows in': s.rows_in,
+            'rows out': s.rows_out,
+            'alloc KB': _kb(s.alloc_bytes),
+            'peak KB': _kb(s.peak_bytes),
+        }
+        for s in spans
+    ])
+    container.caption(f"Total: {sum(s.seconds for s in spans) * 1000:.1f} ms"
+                      + ("" if TRACE_MEMORY else " · memory columns need BIRD_PERF=1"))
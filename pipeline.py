@@ -0,0 +1,314 @@
+import argparse
+import hashlib
+import json
+import os
+import pickle
+
+import pandas as pd
+
+from bird_anomaly import anomaly_table
+from bird_data import all_data_files, dataset_version
+from bird_density import density_table
+from bird_diversity import abundance_matrix, diversity_table
+from bird_ingest import ingest_park, park_source, stored_observations
+from bird_pivot import park_year, species_month, year_month
+from bird_similarity import METRICS, similarity_table
+from bird_store import replace_atomically
+from figure_cache import barh_chart, heatmap_chart
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ARTIFACT_ROOT = os.environ.get('BIRD_ARTIFACTS', os.path.join(HERE, '.bird_artifacts'))
+REPORT_ROOT = os.path.join(HERE, 'reports')
+
+# Bump a step's version whenever its code changes so its artifacts are rebuilt
+STEP_VERSIONS = {
+    'ingest': '3',
+    'clean': '3',
+    'aggregate': '2',
+    'figures': '1',
+    'park_year': '1',
+    'diversity': '1',
+    'similarity': '1',
+    'density': '1',
+    'anomalies': '1',
+}
+
+
+class ArtifactStore:
+    """Content-addressed pickles plus what each node was last built from."""
+
+    def __init__(self, root=ARTIFACT_ROOT):
+        self.root = root
+        self.state_path = os.path.join(root, 'state.json')
+        try:
+            with open(self.state_path) as fh:
+                self.state = json.load(fh)
+        except FileNotFoundError:
+            self.state = {}
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key + '.pkl')
+
+    def has(self, key):
+        return os.path.exists(self._path(key))
+
+    def get(self, key):
+        with open(self._path(key), 'rb') as fh:
+            return pickle.load(fh)
+
+    def put(self, node, key, value, inputs):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        def write(tmp):
+            with open(tmp, 'wb') as fh:
+                pickle.dump(value, fh, protocol=pickle.HIGHEST_PROTOCOL)
+
+        replace_atomically(path, write)
+        self.record(node, key, inputs)
+
+    def record(self, node, key, inputs):
+        self.state[node] = {'key': key, **inputs}
+
+    def save_state(self):
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.state_path, 'w') as fh:
+            json.dump(self.state, fh, indent=1, sort_keys=True)
+
+
+# ---------------------------------------------------------------------------
+# Steps: each receives its dependencies' artifacts, in deps order, and returns its artifact
+
+def run_ingest(path):
+    rows = ingest_park(path)
+    return {'path': path, 'new_rows': rows}
+
+
+def run_clean(ingested, path):
+    return stored_observations(path)
+
+
+def run_aggregate(df):
+    counts = df.groupby('common_name', observed=True)['initial_three_min_cnt'].sum()
+    aggregates = {
+        'top_species': counts.sort_values(ascending=False).head(10),
+        'daily_totals': df.groupby('date')['initial_three_min_cnt'].sum(),
+        'monthly_trend': year_month(df),
+        'species_month': species_month(df),
+    }
+    if 'site_name' in df.columns:
+        richness = df.groupby('site_name', observed=True)['common_name'].nunique()
+        aggregates['site_richness'] = richness.sort_values(ascending=False)
+    return aggregates
+
+
+def run_figures(aggregates, unit):
+    figures = {
+        'top_species.png': barh_chart(aggregates['top_species'], f"{unit}: Top 10 Most Counted Bird Species",
+                                      xlabel="Total Bird Count"),
+        'monthly_trend.png': heatmap_chart(aggregates['monthly_trend'], f"{unit}: Monthly Bird Observation Trend",
+                                           xlabel="Month", ylabel="Year"),
+    }
+    if 'site_richness' in aggregates:
+        figures['site_richness.png'] = barh_chart(aggregates['site_richness'], f"{unit}: Species Richness by Site",
+                                                  xlabel="Number of Unique Species", palette='viridis')
+    return figures
+
+
+def run_park_year(units, *frames):
+    matrix = park_year(dict(zip(units, frames)))
+    return {'park_year.png': heatmap_chart(matrix, "Bird Count by Park and Year", xlabel="Year", ylabel="Park",
+                                           figsize=(10, max(4, len(units) * 0.45)))}
+
+
+def run_diversity(units, *frames):
+    abundance = abundance_matrix(dict(zip([tuple(unit.split('-', 1)) for unit in units], frames)))
+    outputs = {f"diversity_{level}.csv": diversity_table(abundance, level, by_year=True).to_csv(index=False).encode()
+               for level in ('plot', 'site', 'park')}
+    parks = diversity_table(abundance, 'park', by_year=False)
+    shannon = parks.set_index(parks['habitat'] + '-' + parks['park'])['shannon'].sort_values(ascending=False)
+    outputs['diversity_shannon.png'] = barh_chart(shannon, "Shannon Diversity by Park", xlabel="Shannon H'",
+                                                  palette='viridis', figsize=(10, max(4, len(units) * 0.4)))
+    return outputs
+
+
+def run_similarity(units, *frames):
+    abundance = abundance_matrix(dict(zip([tuple(unit.split('-', 1)) for unit in units], frames)))
+    outputs = {f"similarity_park_{metric}.csv": similarity_table(abundance, 'park', metric).to_csv().encode()
+               for metric in METRICS}
+    outputs['similarity_plot_bray_curtis.csv'] = similarity_table(abundance, 'plot', 'bray_curtis').to_csv().encode()
+    parks = similarity_table(abundance, 'park', 'bray_curtis')
+    size = max(6, len(units) * 0.6)
+    outputs['similarity_park.png'] = heatmap_chart(parks, "Bray-Curtis Similarity Between Parks", cmap='viridis',
+                                                   fmt_annot='.2f', figsize=(size + 2, size))
+    return outputs
+
+
+def run_density(units, *frames):
+    # Species densities for every park and year; parks are fitted in parallel
+    table = density_table(dict(zip([tuple(unit.split('-', 1)) for unit in units], frames)))
+    totals = table.groupby(['park', 'year'])['density_ha'].sum()
+    totals.index = pd.Index([f"{park} {year}" for park, year in totals.index], name='Park')
+    return {'density.csv': table.to_csv(index=False).encode(),
+            'density_parks.png': barh_chart(totals.sort_values(ascending=False), "Total Bird Density by Park",
+                                            xlabel="Birds per hectare (distance sampling)",
+                                            figsize=(10, max(4, len(totals) * 0.4)))}
+
+
+def run_anomalies(units, *frames):
+    # Ranked spikes and collapses across every species x park daily series in one batch
+    table = anomaly_table(dict(zip([tuple(unit.split('-', 1)) for unit in units], frames)))
+    return {'anomalies.csv': table.to_csv(index=False).encode()}
+
+
+def build_graph(files):
+    # node id -> {'step', 'deps', 'run', 'source', 'output'}; deps are node ids
+    graph = {}
+    for (habitat, park), path in files.items():
+        unit = f"{habitat}-{park}"
+        graph[f"{unit}/ingest"] = {'step': 'ingest', 'deps': [], 'source': park_source(path),
+                                   'run': lambda path=path: run_ingest(path)}
+        graph[f"{unit}/clean"] = {'step': 'clean', 'deps': [f"{unit}/ingest"],
+                                  'run': lambda ingested, path=path: run_clean(ingested, path)}
+        graph[f"{unit}/aggregate"] = {'step': 'aggregate', 'deps': [f"{unit}/clean"], 'run': run_aggregate}
+        graph[f"{unit}/figures"] = {'step': 'figures', 'deps': [f"{unit}/aggregate"], 'output': unit,
+                                    'run': lambda aggregates, unit=unit: run_figures(aggregates, unit)}
+    if files:
+        units = [f"{habitat}-{park}" for habitat, park in files]
+        graph["ALL/park_year"] = {'step': 'park_year', 'deps': [f"{unit}/clean" for unit in units], 'output': 'ALL',
+                                  'run': lambda *frames: run_park_year(units, *frames)}
+        graph["ALL/diversity"] = {'step': 'diversity', 'deps': [f"{unit}/clean" for unit in units], 'output': 'ALL',
+                                  'run': lambda *frames: run_diversity(units, *frames)}
+        graph["ALL/similarity"] = {'step': 'similarity', 'deps': [f"{unit}/clean" for unit in units], 'output': 'ALL',
+                                   'run': lambda *frames: run_similarity(units, *frames)}
+        graph["ALL/density"] = {'step': 'density', 'deps': [f"{unit}/clean" for unit in units], 'output': 'ALL',
+                                'run': lambda *frames: run_density(units, *frames)}
+        graph["ALL/anomalies"] = {'step': 'anomalies', 'deps': [f"{unit}/clean" for unit in units], 'output': 'ALL',
+                                  'run': lambda *frames: run_anomalies(units, *frames)}
+    return graph
+
+
+# ---------------------------------------------------------------------------
+# Planning and execution
+
+def topological_order(graph):
+    order, seen = [], set()
+
+    def visit(node):
+        if node in seen:
+            return
+        seen.add(node)
+        for dep in graph[node]['deps']:
+            visit(dep)
+        order.append(node)
+
+    for node in graph:
+        visit(node)
+    return order
+
+
+def node_inputs(graph):
+    # Everything a node's output depends on: step version, source file hash, inputs' keys
+    inputs = {}
+    for node in topological_order(graph):
+        spec = graph[node]
+        inputs[node] = {
+            'step': spec['step'],
+            'version': STEP_VERSIONS[spec['step']],
+            'source': dataset_version(spec['source']) if spec.get('source') else None,
+            'deps': [_key(inputs[dep]) for dep in spec['deps']],
+        }
+    return inputs
+
+
+def _key(inputs):
+    return hashlib.sha1(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+
+def plan(graph, store):
+    inputs = node_inputs(graph)
+    keys = {node: _key(node_input) for node, node_input in inputs.items()}
+    actions = {}
+    for node in topological_order(graph):
+        spec = graph[node]
+        previous = store.state.get(node)
+        if store.has(keys[node]):
+            actions[node] = ('reuse', 'artifact up to date')
+        elif not isinstance(previous, dict):
+            actions[node] = ('rebuild', 'never built')
+        elif previous['version'] != inputs[node]['version']:
+            actions[node] = ('rebuild', f"step '{spec['step']}' version changed")
+        elif previous['source'] != inputs[node]['source']:
+            actions[node] = ('rebuild', f"source changed ({os.path.basename(spec['source'])})")
+        else:
+            changed = [dep for dep in spec['deps'] if actions[dep][0] == 'rebuild']
+            actions[node] = ('rebuild', f"input changed ({', '.join(changed) or 'artifact missing'})")
+    return keys, inputs, actions
+
+
+def write_outputs(unit, figures, report_root):
+    out_dir = os.path.join(report_root, unit)
+    os.makedirs(out_dir, exist_ok=True)
+    for name, data in figures.items():
+        path = os.path.join(out_dir, name)
+        if os.path.exists(path):
+            with open(path, 'rb') as fh:
+                if fh.read() == data:
+                    continue
+        with open(path, 'wb') as fh:
+            fh.write(data)
+
+
+def run(graph, store, report_root=REPORT_ROOT):
+    keys, built_from, actions = plan(graph, store)
+    loaded = {}
+
+    def artifact(node):
+        if node not in loaded:
+            loaded[node] = store.get(keys[node])
+        return loaded[node]
+
+    for node in topological_order(graph):
+        spec = graph[node]
+        if actions[node][0] == 'rebuild':
+            loaded[node] = spec['run'](*[artifact(dep) for dep in spec['deps']])
+            store.put(node, keys[node], loaded[node], built_from[node])
+        else:
+            store.record(node, keys[node], built_from[node])
+        if spec.get('output'):
+            write_outputs(spec['output'], artifact(node), report_root)
+    store.save_state()
+    return actions
+
+
+def print_plan(actions):
+    if not actions:
+        print("Nothing to run: no parks matched")
+        return
+    width = max(len(node) for node in actions)
+    for node, (action, reason) in actions.items():
+        print(f"{node:<{width}}  {action:<7}  {reason}")
+    rebuilt = sum(action == 'rebuild' for action, _ in actions.values())
+    print(f"{rebuilt} of {len(actions)} steps to rebuild")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild park aggregates and figures, recomputing only what changed.")
+    parser.add_argument('--parks', help="comma separated park codes (default: all)")
+    parser.add_argument('--dry-run', action='store_true', help="explain what would rebuild without running anything")
+    parser.add_argument('--output', default=REPORT_ROOT, help="directory for the rendered figures")
+    args = parser.parse_args()
+
+    parks = set(args.parks.split(',')) if args.parks else None
+    files = {key: path for key, path in all_data_files().items() if parks is None or key[1] in parks}
+    graph = build_graph(files)
+    store = ArtifactStore()
+
+    if args.dry_run:
+        print_plan(plan(graph, store)[2])
+        return
+    print_plan(run(graph, store, args.output))
+
+
+if __name__ == "__main__":
+    main()
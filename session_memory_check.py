@@ -0,0 +1,76 @@
+import argparse
+import random
+import sys
+import threading
+import tracemalloc
+
+from bird_data import data_file, load_observations, shared_observations
+from bird_filters import filter_positions
+
+SESSION_COUNTS = [1, 5, 10, 25, 50]
+
+
+def random_spec(df, rng):
+    years = sorted(df['date'].dt.year.unique())
+    species = sorted(df['common_name'].unique())
+    return {'year': rng.choice(years), 'species': rng.choice(species)}
+
+
+def run_sessions(path, n_sessions, shared, seed=0):
+    # Each simulated session keeps what a Streamlit session would hold between reruns
+    sessions = [None] * n_sessions
+
+    def session(i):
+        rng = random.Random(seed + i)
+        if shared:
+            df, _ = shared_observations(path)
+            positions = filter_positions(df, random_spec(df, rng))
+            sessions[i] = (df, positions)
+        else:
+            df = load_observations(path)
+            filtered = df.copy()
+            filtered = filtered.iloc[filter_positions(filtered, random_spec(filtered, rng))]
+            sessions[i] = (df, filtered)
+
+    tracemalloc.start()
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(n_sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare memory held by N concurrent dashboard sessions.")
+    parser.add_argument('--park', default='PRWI')
+    parser.add_argument('--habitat', default='FOREST')
+    parser.add_argument('--max-overhead', type=float, default=0.05,
+                        help="fail if each extra shared session costs more than this fraction of the dataset size")
+    args = parser.parse_args()
+    path = data_file(args.park, args.habitat)
+
+    # Warm the shared frame so every count measures session overhead only
+    df, _ = shared_observations(path)
+    frame_mb = df.memory_usage(deep=True).sum() / 1e6
+    print(f"Shared frame: {len(df)} rows, {frame_mb:.2f} MB")
+
+    print(f"{'sessions':>8} {'shared MB':>10} {'per-session copy MB':>20}")
+    shared_mb = {}
+    for n in SESSION_COUNTS:
+        shared_current, _ = run_sessions(path, n, shared=True)
+        copy_current, _ = run_sessions(path, n, shared=False)
+        shared_mb[n] = shared_current / 1e6
+        print(f"{n:>8} {shared_mb[n]:>10.2f} {copy_current / 1e6:>20.2f}")
+
+    first, last = SESSION_COUNTS[0], SESSION_COUNTS[-1]
+    per_session = (shared_mb[last] - shared_mb[first]) / (last - first)
+    print(f"Shared memory per extra session: {per_session * 1e3:.1f} KB ({per_session / frame_mb:.1%} of the dataset)")
+    if per_session > args.max_overhead * frame_mb:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()